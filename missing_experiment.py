@@ -10,8 +10,6 @@
 
 
 import networkx as nx
-import rumor_centrality.rumor_detection as raw
-import rumor_centrality.jordan_center_alternative as jo
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 import numpy as np
@@ -19,11 +17,18 @@ from rumor_centrality.graph_generator import internet, us_power_grid, scale_free
 from time import time
 from multiprocessing import Pool
 from typing import List, Tuple, Dict
-from rumor_centrality import graph_simulations
+from rumor_centrality.experiment_scheduler import worker_graph
 from rumor_centrality.graph_visualization import plot_nx_graph
+from rumor_centrality.graph_distances import graph_fingerprint
+from rumor_centrality.result_store import ResultStore, save_graph, load_graph
+from rumor_centrality.sweep import stream_sweep
+from rumor_centrality.seeding import seeded_globals, task_rng
+from rumor_centrality.pipeline import StreamingSummary, sample_task
+from rumor_centrality.missing_nodes import METRICS, RESULT_VERSION, SIMULATIONS, sample_stages
+from functools import partial
 import random
 import pickle
-from os.path import join
+from os.path import join, exists
 from multiprocessing import Pool
 import sys
 from os import makedirs
@@ -40,15 +45,8 @@ graph_types = {
 
 
 infected_nodes_percent = 0.3
-sim_si = lambda g: graph_simulations.si(g, -1, 0.3, 1, int(len(g.nodes) * infected_nodes_percent), 10, True)
-sim_sis = lambda g: graph_simulations.sis(g, -1, 0.3, 0.1, 1, int(len(g.nodes) * infected_nodes_percent), 10, True)
-sim_sir = lambda g: graph_simulations.sir(g, -1, 0.3, 0.1, 1, int(len(g.nodes) * infected_nodes_percent), 10, True)
-
-simulations = {
-    "si": sim_si,
-    "sis": sim_sis,
-    "sir": sim_sir,
-}
+# Simulations and metrics are defined in rumor_centrality.missing_nodes
+simulations = SIMULATIONS
 
 # Choose Graph
 _, graph_name, output_dir, simulation = sys.argv
@@ -62,39 +60,41 @@ output_dir = join(output_dir, simulation, graph_name)
 makedirs(output_dir, exist_ok=True)
 
 # Available Metrics
-metrics = {
-    "rumor_centrality" : lambda g: raw.get_center_prediction(
-        raw.networkx_graph_to_adj_list(g), use_fact=False
-    ),
-    "jordan_centrality": jo.centers_by_jordan_center,
-    "betweenness_centrality": jo.centers_by_betweenness_centrality,
-    "distance_centrality": jo.centers_by_distance_centrality,
-}
+metrics = METRICS
 
 # Setup Experiment Parameters
 graph_callback = graph_types[graph_name]
 sample_size = 100
+# All random streams (reference graph, simulations, removals) are derived from it, see seeding
+root_seed = 0
 
 percent_radius = [0.0, 0.01, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7]  # Percent of nodes to remove
 
 
 graph_size = len(graph_callback().nodes)
 
-def name_builder(name, pickle=True):
+def name_builder(name, pickle=True, extension=".pickle"):
     postfix = ""
     if pickle:
-        postfix = ".pickle"
+        postfix = extension
     return f"{name}__config_graph_{graph_name}_nodes_{graph_size}_samples_{sample_size}_{postfix}"
 
-main_ref_graph = graph_callback().copy(as_view=True)
-
 
 # In[7]:
 
 
-if output_dir is not None:
-    with open(join(output_dir, name_builder("main_ref_graph")), "wb") as f:
-        pickle.dump(main_ref_graph, f)
+# The reference graph is generated from root_seed and stored as edge arrays, so that an interrupted run
+# is resumed on the same graph even if the generators change. It is always used as loaded from the file,
+# so that the neighbor order, and with it the simulations, are the same in every run
+main_ref_graph_path = join(output_dir, name_builder("main_ref_graph", extension=".npz"))
+if not exists(main_ref_graph_path):
+    with seeded_globals(task_rng(root_seed, graph_name)):
+        save_graph(main_ref_graph_path, graph_callback())
+main_ref_graph = load_graph(main_ref_graph_path).copy(as_view=True)
+
+# Workers load the reference graph once and share it between their samples
+graph_callbacks = {"reference": partial(load_graph, main_ref_graph_path)}
+reference_callback = partial(worker_graph, "reference")
 
 
 # In[8]:
@@ -107,149 +107,58 @@ def get_hop_distance(g, center, predicted_center):
 # In[9]:
 
 
-def remove_node_and_reconnect(g, node):
-    neighbors = list(g.neighbors(node))
-    for i in neighbors:
-        for j in neighbors:
-            if i != j:
-                # Duplicated edges naturally not possible on a graph
-                g.add_edge(i, j)
-    g.remove_node(node)
-
-
-# In[10]:
-
-
-import_graph = None
-def get_experiment_graph(g, percent_missing):
-    g = g.copy(as_view=True)
-    nodes_to_remove = int(len(g.nodes) * percent_missing)
-
-    _g = g.copy()
-    removed_nodes = []
-    for _ in range(nodes_to_remove):
-        node_to_remove = random.choice(list(_g.nodes))
-        remove_node_and_reconnect(_g, node_to_remove)
-        removed_nodes.append(node_to_remove)
-    return _g, removed_nodes
-
-
-def simulate_remove_predict(p_r):
-    infected_graph, centers = simulations[simulation](main_ref_graph)
-
-    if nx.is_empty(infected_graph):
-        return None
-    ex_graph, removed_nodes = get_experiment_graph(infected_graph, p_r)
-
-    if nx.is_empty(ex_graph):
-        return None
-
-    if not nx.is_connected(ex_graph):
-        return None
-
-    predicted_centers = {}
-    for metric_name, metric_callback in metrics.items():
-        predicted_centers[metric_name] = metric_callback(ex_graph)
-
-    r = {
-        "real_centers": centers,
-        "predicted_centers": predicted_centers,
-        "ex_graph": ex_graph,
-        "removed_nodes": removed_nodes,
-    }
-    return r
-
-
-results = {}
-for p_r in tqdm(percent_radius):
-    with Pool(3) as threads:
-        results[p_r] = threads.map(simulate_remove_predict, [p_r] * sample_size)
-
-
-if output_dir is not None:
-    with open(join(output_dir, name_builder("results")), "wb") as f:
-        pickle.dump(results, f)
-
-
-# In[13]:
-
-
-shortest_paths = nx.shortest_path(main_ref_graph)
-
-
-# In[14]:
-
-
-def get_best_hop_distance(g, original_centers, predicted_centers):
-    best_pair = None
-    best_distance = len(g.nodes)
-    for o_c in original_centers:
-        for p_c in predicted_centers:
-            d = len(shortest_paths[o_c][p_c])
-            if d < best_distance:
-                best_distance = d
-                best_pair = (o_c, p_c)
-    return best_pair, best_distance
-
-# In[15]:
-
-
-def get_all_hop_distances(g, original_centers, predicted_centers):
-    distances = []
-    for o_c in original_centers:
-        for p_c in predicted_centers:
-            distances.append(len(shortest_paths[o_c][p_c]))
-    return distances
-
-from statistics import median
-
-def get_median_hop_distance(g, original_centers, predicted_centers):
-    return median(get_all_hop_distances(g, original_centers, predicted_centers))
-
-
-center_results = {}
-for k, v in results.items():
-    predicted_centers = []
-    for _r in v:
-        if _r is None:
-            predicted_centers.append((None, None))
-        else:
-            predicted_centers.append((_r["predicted_centers"], _r["real_centers"]))
-    center_results[k] = predicted_centers
+# Every sample is identified by its parameters, including the content of the reference graph.
+# It is appended as soon as it is done, samples stored by an interrupted run are skipped.
+# The seed of a sample is derived from its parameters, missing_nodes.simulate_and_remove
+# regenerates its infection and reduced graph from it
+reference_fingerprint = graph_fingerprint(main_ref_graph)
+tasks = []
+for p_r in percent_radius:
+    for sample in range(sample_size):
+        params = {
+            "graph": graph_name,
+            "reference": reference_fingerprint,
+            "dynamic": simulation,
+            "infected_nodes_percent": infected_nodes_percent,
+            "p_r": p_r,
+            "metrics": list(metrics),
+            "root_seed": root_seed,
+            "sample": sample,
+            "result_version": RESULT_VERSION,
+        }
+        tasks.append(sample_task(params, *sample_stages(reference_callback, simulation, infected_nodes_percent, p_r)))
 
 
 # In[18]:
 
 
-reference_map = []
-
-# Map results to hop distances
-hop_distance_freq_by_p_r_by_metric = {}
-
-for metric_name in metrics.keys():
-    hop_distance_freq_by_p_r = {}
-    for p_r, values in tqdm(center_results.items()):
-        hop_distance_freq = {}
-        for i, centers in tqdm(enumerate(values)):
-            predicted_centers = centers[0]
-            real_centers = centers[1]
-            if predicted_centers is None or real_centers is None:
-                hop_distance_freq[-1] = hop_distance_freq.get(-1, 0) + 1
-                reference_map.append((p_r, i, -1))
-            else:
-                predicted_centers = predicted_centers[metric_name]
-                # best_pair, best_distance = get_best_hop_distance(main_ref_graph, real_centers, predicted_centers)
-                median_distance = get_median_hop_distance(main_ref_graph, real_centers, predicted_centers)
-                hop_distance_freq[median_distance] = hop_distance_freq.get(median_distance, 0) + 1
+# Hop distances are counted as the records arrive, stored ones first, failed samples as hop distance -1.
+# Only the summaries are kept, not the samples
+hop_distance_summary_by_p_r_by_metric = {
+    metric_name: {p_r: StreamingSummary(missing=-1) for p_r in percent_radius} for metric_name in metrics.keys()
+}
 
-                reference_map.append((p_r, i, median_distance))
+results_path = join(output_dir, name_builder("results", extension=".jsonl"))
+for record in tqdm(stream_sweep(ResultStore(results_path), tasks, graph_callbacks, processes=3), total=len(tasks)):
+    _r, p_r = record["result"], record["params"]["p_r"]
+    for metric_name in metrics.keys():
+        median_distance = None if _r is None else _r["median_hop_distance"][metric_name]
+        hop_distance_summary_by_p_r_by_metric[metric_name][p_r].add(median_distance)
 
-        hop_distance_freq_by_p_r[p_r] = hop_distance_freq
-    hop_distance_freq_by_p_r_by_metric[metric_name] = hop_distance_freq_by_p_r
+hop_distance_freq_by_p_r_by_metric = {
+    metric_name: {p_r: summary.frequencies for p_r, summary in summaries.items()}
+    for metric_name, summaries in hop_distance_summary_by_p_r_by_metric.items()
+}
+hop_distance_stats_by_p_r_by_metric = {
+    metric_name: {p_r: summary.stats.to_dict() for p_r, summary in summaries.items()}
+    for metric_name, summaries in hop_distance_summary_by_p_r_by_metric.items()
+}
 
 if output_dir is not None:
     with open(join(output_dir, name_builder("hop_distance_freq_by_p_r_by_metric")), "wb") as f:
         pickle.dump(hop_distance_freq_by_p_r_by_metric, f)
+    with open(join(output_dir, name_builder("hop_distance_stats_by_p_r_by_metric")), "wb") as f:
+        pickle.dump(hop_distance_stats_by_p_r_by_metric, f)
 
 
 def rgba(minimum, maximum, value):
@@ -1,17 +1,18 @@
-import pickle
 import sys
 from functools import partial
 from itertools import product
-from multiprocessing import Pool, TimeoutError
 from os import makedirs
 from os.path import join
-from pathlib import Path
 
 from tqdm import tqdm
 
 import rumor_centrality.jordan_center_alternative as jo
-from rumor_centrality.experiment import multiple_sources_experiment_metric
+from rumor_centrality.experiment import multiple_sources_experiment_metrics
+from rumor_centrality.experiment_scheduler import worker_graph
 from rumor_centrality.graph_generator import synthetic_internet, scale_free, us_power_grid, internet
+from rumor_centrality.result_store import ResultStore
+from rumor_centrality.seeding import derive_seed
+from rumor_centrality.sweep import pending_tasks, run_sweep
 from rumor_centrality.rumor_detection import get_center_prediction
 
 experiment_params = {
@@ -20,6 +21,14 @@ experiment_params = {
     "infection_prob": 0.3,
     "num_infection_centers": [2, 3, 5, 7, 10],
     "exp_iterations": 100,
+    # Cluster representatives from the farthest pair of three double sweeps instead of the all pairs periphery
+    "seed_selection": "random_sweeps",
+}
+
+# Datasets, loaded once per worker process
+static_graphs = {
+    "us_power_grid": us_power_grid,
+    "internet": internet,
 }
 
 # Available Graphs
@@ -29,25 +38,25 @@ graph_types = {
     "synthetic_internet_10000": partial(synthetic_internet, 10000),
     # "scale_free_100": lambda: nx.Graph(scale_free(1000)),
     "scale_free_10000": partial(scale_free, 10000),
-    "us_power_grid": us_power_grid,
-    "internet": internet,
+    "us_power_grid": partial(worker_graph, "us_power_grid"),
+    "internet": partial(worker_graph, "internet"),
 }
 
+# Metric name -> (prediction callback, callback runs on nx graph)
 metrics = {
-    "rumor_centrality": get_center_prediction,
-    "jordan_centrality": jo.centers_by_jordan_center,
-    "betweenness_centrality": jo.centers_by_betweenness_centrality,
-    "distance_centrality": jo.centers_by_distance_centrality,
+    "rumor_centrality": (get_center_prediction, False),
+    "jordan_centrality": (jo.centers_by_jordan_center, True),
+    "betweenness_centrality": (jo.centers_by_betweenness_centrality, True),
+    "distance_centrality": (jo.centers_by_distance_centrality, True),
 }
 
+# Seconds after which the prediction of a single metric is stopped and recorded as None
+metric_timeout = 250
+# All metrics run on the same infection in one task, which is stopped as a whole after
+task_timeout = metric_timeout * (len(metrics) + 1)
 
-def unpack_result(result):
-    try:
-        return_value = result.get(timeout=250)
-    except TimeoutError:
-        return_value = None
-
-    return return_value
+# The seeds of all tasks are derived from it, see seeding
+root_seed = 0
 
 
 if __name__ == "__main__":
@@ -61,30 +70,46 @@ if __name__ == "__main__":
     output_dir = join(output_dir, "centers")
     makedirs(output_dir, exist_ok=True)
 
-    result_mult_metrics = []
-
     num_infection_centers = cluster_numbers or experiment_params["num_infection_centers"]
     max_infected_nodes = experiment_params["max_infected_nodes"]
     infection_prob = experiment_params["infection_prob"]
     exp_iterations = experiment_params["exp_iterations"]
-
-    for num_infection_center, max_inf_nodes, graph_name, metric_name in tqdm(
-            list(product(num_infection_centers, max_infected_nodes, graph_types, metrics))):
-        graph = graph_types[graph_name]
-        metric = metrics[metric_name]
-
-        with Pool(processes=10) as pool:
-            multiple_results = [pool.apply_async(multiple_sources_experiment_metric, (
+    seed_selection = experiment_params["seed_selection"]
+
+    # Every task is identified by its parameters, the sample distinguishes the repetitions.
+    # Its seed is derived from the parameters, so every task can be rerun with the same graph and infection
+    tasks = []
+    for num_infection_center, max_inf_nodes, graph_name in \
+            product(num_infection_centers, max_infected_nodes, graph_types):
+        for sample in range(exp_iterations):
+            params = {
+                "graph": graph_name,
+                "dynamic": "si",
+                "infection_prob": infection_prob,
+                "max_infected_nodes": max_inf_nodes,
+                "num_infection_centers": num_infection_center,
+                "metrics": list(metrics),
+                "seed_selection": seed_selection,
+                "root_seed": root_seed,
+                "sample": sample,
+            }
+            tasks.append((params, multiple_sources_experiment_metrics, (
                 num_infection_center,
                 infection_prob,
                 max_inf_nodes,
-                graph,
+                graph_types[graph_name],
                 graph_name,
-                metric,
-                metric_name,
-                metric_name != "rumor_centrality",
-            )) for i in range(exp_iterations)]
-            result_mult_metrics.extend([unpack_result(res) for res in multiple_results])
-
-    with Path(join(output_dir, f"multiple_centers_all_graphs_centers_{cluster_numbers}.pickle")).open("wb") as f:
-        pickle.dump(result_mult_metrics, f)
+                metrics,
+                "exact",
+                metric_timeout,
+                derive_seed(params),
+                seed_selection,
+            )))
+
+    # Every finished task appends one record {"key", "params", "result": {metric name: result dict}},
+    # a result or a timed out metric is None. Tasks stored by an interrupted run are skipped
+    result_store = ResultStore(join(output_dir, f"multiple_centers_all_graphs_centers_{cluster_numbers}.jsonl"))
+    pending = pending_tasks(result_store, tasks)
+    for _ in tqdm(run_sweep(result_store, pending, static_graphs, processes=10, timeout=task_timeout),
+                  total=len(pending)):
+        pass
@@ -0,0 +1,144 @@
+"""Compact integer indexed graph representation in csr format"""
+from collections.abc import Mapping
+from typing import List, Iterable, Tuple, Any
+
+import networkx as nx
+import numpy as np
+
+
+class CompactGraph(Mapping):
+    """Undirected graph with nodes relabeled to 0..n-1 and stored in two flat arrays.
+
+    The neighbors of node index i are indices[indptr[i]:indptr[i + 1]] and labels[i] is its original label.
+    The graph also behaves like a read-only adj list dict keyed by the original labels,
+    so it can be passed to all functions expecting an adj list."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, labels: List[Any]):
+        self.indptr = indptr
+        self.indices = indices
+        self.labels = labels
+        self.index = {label: i for i, label in enumerate(labels)}
+        self._adjacency_lists = None
+
+    @classmethod
+    def from_index_edges(cls, sources: np.ndarray, targets: np.ndarray, labels: List[Any]) -> "CompactGraph":
+        """Builds the graph from edges given as node indices into labels.
+        Edges are made symmetric, self loops and duplicated edges are dropped."""
+        n = len(labels)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+
+        not_loop = sources != targets
+        sources, targets = sources[not_loop], targets[not_loop]
+
+        # Encode each directed edge as one integer, unique also sorts by source and then target
+        codes = np.unique(np.concatenate([sources * n + targets, targets * n + sources]))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes // n, minlength=n), out=indptr[1:])
+        indices = (codes % n).astype(np.int32 if n < 2 ** 31 else np.int64)
+
+        return cls(indptr, indices, list(labels))
+
+    @classmethod
+    def from_edge_list(cls, edges, nodes: Iterable[Any] = None) -> "CompactGraph":
+        """Builds the graph from an edge list (or an array of shape (m, 2) or wider, extra columns are ignored).
+        Nodes can be given to include isolated nodes. Labels are sorted."""
+        edges = np.asarray(edges)
+        if edges.size == 0:
+            edges = edges.reshape(0, 2)
+        endpoints = edges[:, :2]
+
+        all_labels = endpoints.ravel()
+        if nodes is not None:
+            all_labels = np.concatenate([np.asarray(list(nodes), dtype=all_labels.dtype), all_labels])
+
+        labels = np.unique(all_labels)
+        codes = np.searchsorted(labels, endpoints)
+
+        return cls.from_index_edges(codes[:, 0], codes[:, 1], labels.tolist())
+
+    @classmethod
+    def from_networkx(cls, g: nx.Graph) -> "CompactGraph":
+        """Builds the graph from a networkx graph, keeping the node order of g"""
+        labels = list(g.nodes)
+        index = {label: i for i, label in enumerate(labels)}
+        sources = np.fromiter((index[u] for u, _ in g.edges), dtype=np.int64, count=g.number_of_edges())
+        targets = np.fromiter((index[v] for _, v in g.edges), dtype=np.int64, count=g.number_of_edges())
+
+        return cls.from_index_edges(sources, targets, labels)
+
+    @classmethod
+    def from_adj_list(cls, adj_list) -> "CompactGraph":
+        """Builds the graph from a symmetric adj list dict node -> neighbors.
+        Keeps the node order of the dict and the neighbor order of each node."""
+        labels = list(adj_list.keys())
+        index = {label: i for i, label in enumerate(labels)}
+
+        degrees = np.fromiter((len(adj_list[node]) for node in labels), dtype=np.int64, count=len(labels))
+        indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.fromiter(
+            (index[neighbor] for node in labels for neighbor in adj_list[node]),
+            dtype=np.int32 if len(labels) < 2 ** 31 else np.int64, count=indptr[-1])
+
+        return cls(indptr, indices, labels)
+
+    def __getitem__(self, label) -> List[Any]:
+        i = self.index[label]
+        return [self.labels[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()]
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, label) -> bool:
+        return label in self.index
+
+    def number_of_nodes(self) -> int:
+        return len(self.labels)
+
+    def number_of_edges(self) -> int:
+        return len(self.indices) // 2
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def neighbors(self, i: int) -> np.ndarray:
+        """Neighbor indices of the node with index i"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def adjacency_lists(self) -> List[List[int]]:
+        """Neighbor indices of all nodes as python lists, which are faster to traverse in pure python.
+        Computed once and cached."""
+        if self._adjacency_lists is None:
+            neighbors = self.indices.tolist()
+            bounds = self.indptr.tolist()
+            self._adjacency_lists = [neighbors[bounds[i]:bounds[i + 1]] for i in range(len(self.labels))]
+        return self._adjacency_lists
+
+    def edge_array(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Index pairs (sources, targets) of all undirected edges with source < target"""
+        sources = np.repeat(np.arange(len(self.labels), dtype=np.int64), self.degrees())
+        forward = sources < self.indices
+        return sources[forward], self.indices[forward].astype(np.int64)
+
+    def subgraph(self, nodes: Iterable[Any]) -> "CompactGraph":
+        """Induced subgraph on the given labels"""
+        kept = np.fromiter((self.index[node] for node in nodes), dtype=np.int64)
+        new_index = np.full(len(self.labels), -1, dtype=np.int64)
+        new_index[kept] = np.arange(len(kept))
+
+        sources, targets = self.edge_array()
+        inside = (new_index[sources] >= 0) & (new_index[targets] >= 0)
+
+        return CompactGraph.from_index_edges(
+            new_index[sources[inside]], new_index[targets[inside]], [self.labels[i] for i in kept])
+
+    def to_networkx(self) -> nx.Graph:
+        g = nx.Graph()
+        g.add_nodes_from(self.labels)
+        sources, targets = self.edge_array()
+        g.add_edges_from((self.labels[u], self.labels[v]) for u, v in zip(sources.tolist(), targets.tolist()))
+        return g
@@ -1,33 +1,118 @@
-from collections import defaultdict
-from typing import List
+from functools import lru_cache
+from typing import List, Dict, Tuple
 
 import networkx as nx
+import numpy as np
 from networkx import single_source_shortest_path_length
 
 
-def hop_distances(g: nx.Graph, predictions: List[int], groundtruths: List[int]) -> List[int]:
+class SourceDistances:
+    """Hop distances in g from source nodes, computed with one BFS per source on first use.
+    Only the distances of the max_sources most recently used sources are kept, so memory stays O(n) per source."""
+
+    def __init__(self, g: nx.Graph, max_sources: int = 128):
+        self.g = g
+        self.from_source = lru_cache(maxsize=max_sources)(self._bfs)
+
+    def _bfs(self, source) -> Dict[int, int]:
+        return single_source_shortest_path_length(self.g, source)
+
+    def distance(self, source, target) -> int:
+        return self.from_source(source)[target]
+
+    def path_length(self, source, target) -> int:
+        """Number of nodes on a shortest path, i.e. the distance + 1"""
+        return self.distance(source, target) + 1
+
+
+def distance_matrix(predictions: List[int], groundtruths: List[int], distances: SourceDistances) -> np.ndarray:
+    """Hop distances with one row per groundtruth and one column per prediction"""
+    matrix = np.empty((len(groundtruths), len(predictions)), dtype=np.int64)
+    for i, groundtruth in enumerate(groundtruths):
+        distances_from_groundtruth = distances.from_source(groundtruth)
+        matrix[i] = [distances_from_groundtruth[predicted_source] for predicted_source in predictions]
+    return matrix
+
+
+def min_cost_assignment(cost: np.ndarray) -> np.ndarray:
+    """Hungarian algorithm for a cost matrix with at most as many rows as columns.
+    Returns the column assigned to each row, so that the summed cost is minimal."""
+    n, m = cost.shape
+    if n > m:
+        raise ValueError(f"Cost matrix with more rows than columns ({n} > {m}) has no assignment")
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # Row assigned to each column, 1-based with column 0 as virtual start
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while p[j0] != 0:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            free_minv = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(free_minv)) + 1
+            delta = free_minv[j1 - 1]
+
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+
+        while j0 != 0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    assignment = np.empty(n, dtype=np.int64)
+    for j in range(1, m + 1):
+        if p[j] != 0:
+            assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+def match_hop_distances(matrix: np.ndarray, matching: str = "greedy") -> List[int]:
+    """Matches groundtruths (rows) to predictions (columns) and returns the matched distances in ascending order.
+
+    "greedy" repeatedly takes the smallest distance of a remaining groundtruth, a prediction can be matched
+    more than once. "optimal" assigns every groundtruth to a different prediction with minimal summed distance,
+    so it needs at least as many predictions as groundtruths."""
+    if matching == "greedy":
+        return np.sort(matrix.min(axis=1)).tolist()
+    if matching == "optimal":
+        if matrix.shape[0] > matrix.shape[1]:
+            raise ValueError(f"Optimal matching of {matrix.shape[0]} groundtruths to {matrix.shape[1]} predictions, "
+                             f"at least as many predictions are needed")
+        assignment = min_cost_assignment(matrix)
+        return np.sort(matrix[np.arange(len(matrix)), assignment]).tolist()
+    raise ValueError(f"Unknown matching {matching}")
+
+
+def hop_distances(g: nx.Graph, predictions: List[int], groundtruths: List[int],
+                  distances: SourceDistances = None, matching: str = "greedy") -> List[int]:
     assert len(predictions) == len(groundtruths), "number of predictions has to be the same as groundtruth"
 
-    distance_matrix = defaultdict(dict)
-    for groundtruth in groundtruths:
-        distance_matrix[groundtruth] = {}
-        distances_from_groundtruth = single_source_shortest_path_length(g, source=groundtruth)
-        for predicted_source in predictions:
-            distance_matrix[groundtruth][predicted_source] = distances_from_groundtruth[predicted_source]
-
-    # iteratively find min distance and remove selected groundtruth (we don't want to be greedy, and also not clever)
-    hop_distance = []
-    for i in range(len(groundtruths)):
-        cur_min = None
-        for groundtruth in distance_matrix:
-            for predicted_source in distance_matrix[groundtruth]:
-                if cur_min is not None and \
-                        distance_matrix[groundtruth][predicted_source] < distance_matrix[cur_min[0]][cur_min[1]]:
-                    cur_min = (groundtruth, predicted_source)
-                elif cur_min is None:
-                    cur_min = (groundtruth, predicted_source)
-
-        hop_distance.append(distance_matrix[cur_min[0]][cur_min[1]])
-        del distance_matrix[cur_min[0]]
-
-    return hop_distance
+    if distances is None:
+        distances = SourceDistances(g, max_sources=len(groundtruths))
+
+    return match_hop_distances(distance_matrix(predictions, groundtruths, distances), matching)
+
+
+def batch_hop_distances(g: nx.Graph, runs: List[Tuple[List[int], List[int]]], matching: str = "greedy",
+                        max_sources: int = 128) -> List[List[int]]:
+    """hop_distances for many (predictions, groundtruths) runs on the same graph,
+    sharing the BFS distances of groundtruths which occur in several runs"""
+    distances = SourceDistances(g, max_sources)
+    return [hop_distances(g, predictions, groundtruths, distances, matching) for predictions, groundtruths in runs]
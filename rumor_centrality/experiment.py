@@ -1,11 +1,17 @@
-from typing import List
+import random
+from functools import partial
+from typing import List, Dict, Tuple, Callable, Optional
 
 import networkx as nx
-from networkx import diameter, is_connected
+from networkx import is_connected
 
-from rumor_centrality.evaluation import hop_distances
-from rumor_centrality.graph_clustering import multiple_rumor_source_prediction, multiple_rumor_source_prediction_metric
+from rumor_centrality.evaluation import hop_distances, SourceDistances
+from rumor_centrality.experiment_scheduler import call_with_timeout
+from rumor_centrality.graph_distances import diameter
+from rumor_centrality.graph_clustering import multiple_rumor_source_prediction, multiple_rumor_source_prediction_metric, \
+    multiple_rumor_source_prediction_metrics
 from rumor_centrality.graph_simulations import si
+from rumor_centrality.seeding import seeded_globals
 
 
 def flatten_list(l: List[List[int]]) -> List[int]:
@@ -13,48 +19,89 @@ def flatten_list(l: List[List[int]]) -> List[int]:
 
 
 def multiple_sources_experiment_metric(num_infection_centers, infection_prob, max_infected_nodes, graph_callback,
-                                       graph_name, prediction_callback, prediction_name, callback_on_nx):
+                                       graph_name, prediction_callback, prediction_name, callback_on_nx,
+                                       diameter_mode="exact", seed: Optional[int] = None,
+                                       seed_selection: str = "periphery"):
+    """Simulates an SI infection from num_infection_centers sources, predicts them and measures the hop distances.
+    The hops are normalized by the diameter of the infection graph, computed exactly or approximated
+    depending on diameter_mode (see graph_distances.diameter). With a seed the experiment is reproducible.
+    seed_selection chooses the cluster representatives, see graph_clustering.get_cluster_reprs."""
+    return multiple_sources_experiment_metrics(
+        num_infection_centers, infection_prob, max_infected_nodes, graph_callback, graph_name,
+        {prediction_name: (prediction_callback, callback_on_nx)}, diameter_mode, seed=seed,
+        seed_selection=seed_selection)[prediction_name]
+
+
+def multiple_sources_experiment_metrics(num_infection_centers, infection_prob, max_infected_nodes, graph_callback,
+                                        graph_name, prediction_callbacks: Dict[str, Tuple[Callable, bool]],
+                                        diameter_mode="exact", metric_timeout: Optional[float] = None,
+                                        seed: Optional[int] = None, seed_selection: str = "periphery") \
+        -> Dict[str, Optional[dict]]:
+    """multiple_sources_experiment_metric for several metrics on the same infection and the same clustering.
+
+    prediction_callbacks maps the metric name to (prediction_callback, callback_on_nx).
+    Returns the result dict of every metric by name, the results only differ in predictions and hops.
+    A metric running longer than metric_timeout seconds gets None as result (see call_with_timeout).
+
+    The graph generation, infection and clustering draw from one random stream seeded by seed, e.g. derived
+    with seeding.derive_seed, so the same seed gives the same experiment in any process."""
+    rng = None if seed is None else random.Random(seed)
 
     while True:
-        exp_graph = nx.Graph(graph_callback())
+        # Generated graphs are seeded through the global state, cached base graphs are not affected
+        with seeded_globals(rng):
+            exp_graph = nx.Graph(graph_callback())
         exp_graph_simulated, infection_sources = si(exp_graph.copy(), iterations=-1,
                                                     infections_centers=num_infection_centers,
                                                     max_infected_nodes=max_infected_nodes,
-                                                    infection_prob=infection_prob)
+                                                    infection_prob=infection_prob, rng=rng)
 
         if is_connected(exp_graph_simulated):
             break
 
-    exp_diameter = diameter(exp_graph_simulated)
-
-    subgraphs_rumor_centers, assignm = multiple_rumor_source_prediction_metric(
-        exp_graph_simulated,
-        num_infection_centers,
-        center_prediction_callback=prediction_callback,
-        callback_runs_on_nxgraph=callback_on_nx,
-    )
+    exp_diameter = diameter(exp_graph_simulated, diameter_mode, rng)
 
     assert len(
         infection_sources) == num_infection_centers, f"In graph {graph_name}, infection sources != num_infection_centers" \
                                                      f"\n num_infection_center: {num_infection_centers}" \
                                                      f"\n len(infection_sources): {len(infection_sources)}" \
                                                      f"\n infection_sources: {infection_sources}"
-    assert len(flatten_list(
-        subgraphs_rumor_centers)) == num_infection_centers, f"In graph {graph_name}, predicted rumor center != num_infection_centers" \
-                                                            f"\nflattened: {flatten_list(subgraphs_rumor_centers)}" \
-                                                            f"\n{subgraphs_rumor_centers}"
-
-    hops = hop_distances(exp_graph, flatten_list(subgraphs_rumor_centers), infection_sources)
-
-    return {
-        "hops": hops,
-        "graph_normalized_hops": list(map(lambda x: x / exp_diameter, hops)),
-        "diameter": exp_diameter,
-        "num_infection_centers": num_infection_centers,
-        "infection_prob": infection_prob,
-        "max_infected_nodes": max_infected_nodes,
-        "predictions": subgraphs_rumor_centers,
-        "ground_truths": infection_sources,
-        "graph": graph_name,
-        "metric": prediction_name,
-    }
+
+    predictions_by_metric, assignm = multiple_rumor_source_prediction_metrics(
+        exp_graph_simulated,
+        prediction_callbacks,
+        num_infection_centers,
+        seed_selection,
+        prediction_runner=partial(call_with_timeout, timeout=metric_timeout),
+        rng=rng,
+    )
+
+    # The bfs from the infection sources are shared by all metrics
+    distances = SourceDistances(exp_graph, max_sources=num_infection_centers)
+    results = {}
+    for prediction_name, subgraphs_rumor_centers in predictions_by_metric.items():
+        if subgraphs_rumor_centers is None:
+            results[prediction_name] = None
+            continue
+
+        assert len(flatten_list(
+            subgraphs_rumor_centers)) == num_infection_centers, f"In graph {graph_name}, predicted rumor center != num_infection_centers" \
+                                                                f"\nflattened: {flatten_list(subgraphs_rumor_centers)}" \
+                                                                f"\n{subgraphs_rumor_centers}"
+
+        hops = hop_distances(exp_graph, flatten_list(subgraphs_rumor_centers), infection_sources, distances)
+
+        results[prediction_name] = {
+            "hops": hops,
+            "graph_normalized_hops": list(map(lambda x: x / exp_diameter, hops)),
+            "diameter": exp_diameter,
+            "num_infection_centers": num_infection_centers,
+            "infection_prob": infection_prob,
+            "max_infected_nodes": max_infected_nodes,
+            "predictions": subgraphs_rumor_centers,
+            "ground_truths": infection_sources,
+            "graph": graph_name,
+            "metric": prediction_name,
+        }
+
+    return results
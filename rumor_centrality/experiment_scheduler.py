@@ -0,0 +1,82 @@
+"""Long-lived process pool running experiment tasks with per-task timeouts
+
+One pool serves a whole parameter sweep. Base graphs are loaded at most once per worker through worker_graph,
+tasks are streamed to idle workers one by one and every task is stopped by a SIGALRM timer inside its worker."""
+import signal
+import time
+from multiprocessing import Pool
+from typing import Callable, Dict, Any, Iterator, List, Tuple, Optional
+
+# Graph loaders, loaded graphs and the task timeout of a worker, set once per process by _init_worker
+_worker_graph_callbacks: Dict[str, Callable[[], Any]] = {}
+_worker_graphs: Dict[str, Any] = {}
+_worker_timeout: Optional[float] = None
+
+
+class TaskTimeout(BaseException):
+    """Raised inside a task when it exceeds its timeout. Derived from BaseException so that
+    library code catching Exception does not swallow it."""
+
+
+def _init_worker(graph_callbacks: Dict[str, Callable[[], Any]], timeout: Optional[float]):
+    global _worker_graph_callbacks, _worker_graphs, _worker_timeout
+    _worker_graph_callbacks = graph_callbacks
+    _worker_graphs = {}
+    _worker_timeout = timeout
+
+
+def worker_graph(name: str):
+    """The base graph registered as name, loaded on first use and then reused by all tasks of this process.
+    Tasks must not modify it. Use partial(worker_graph, name) as graph callback of a task."""
+    if name not in _worker_graphs:
+        _worker_graphs[name] = _worker_graph_callbacks[name]()
+    return _worker_graphs[name]
+
+
+def _raise_timeout(signum, frame):
+    raise TaskTimeout()
+
+
+def call_with_timeout(function: Callable, args: tuple, timeout: Optional[float], default=None):
+    """function(*args), or default if it runs longer than timeout seconds.
+
+    Uses a SIGALRM timer, so it only works in the main thread and on unix (elsewhere there is no timeout).
+    Within a running timeout, e.g. of a task, the earlier deadline applies: if the outer one expires first
+    TaskTimeout is raised to the outer level, otherwise the outer timer is continued afterwards."""
+    if timeout is None or not hasattr(signal, "SIGALRM"):
+        return function(*args)
+
+    outer_remaining = signal.getitimer(signal.ITIMER_REAL)[0]
+    outer_first = 0 < outer_remaining <= timeout
+    started = time.monotonic()
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, outer_remaining if outer_first else timeout)
+    outer_expired = False
+    try:
+        return function(*args)
+    except TaskTimeout:
+        if outer_first:
+            outer_expired = True
+            raise
+        return default
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        if outer_remaining > 0 and not outer_expired:
+            signal.setitimer(signal.ITIMER_REAL, max(outer_remaining - (time.monotonic() - started), 1e-6))
+
+
+def _run_task(indexed_task: Tuple[int, Tuple[Callable, tuple]]) -> Tuple[int, Any]:
+    index, (function, args) = indexed_task
+    return index, call_with_timeout(function, args, _worker_timeout)
+
+
+def run_tasks(tasks: List[Tuple[Callable, tuple]], graph_callbacks: Dict[str, Callable[[], Any]] = None,
+              processes: int = 10, timeout: Optional[float] = 250) -> Iterator[Tuple[int, Any]]:
+    """Runs every task (function, args) as function(*args) in one pool and yields (task index, result)
+    in order of completion. A task running longer than timeout seconds yields None as result.
+
+    graph_callbacks are the loaders of the graphs available through worker_graph,
+    they and all tasks have to be picklable (no lambdas)."""
+    with Pool(processes, initializer=_init_worker, initargs=(graph_callbacks or {}, timeout)) as pool:
+        yield from pool.imap_unordered(_run_task, enumerate(tasks))
@@ -1,11 +1,15 @@
 import random
 from collections import defaultdict
-from typing import List, Dict, Tuple, Iterator, Any
+from functools import partial
+from typing import List, Dict, Tuple, Iterator, Any, Callable, Optional
 
 import networkx as nx
+import numpy as np
 from networkx.algorithms import single_source_shortest_path_length
-from networkx.algorithms.distance_measures import periphery, diameter
+from networkx.algorithms.distance_measures import periphery
 
+from rumor_centrality.compact_graph import CompactGraph
+from rumor_centrality.graph_distances import bfs, diameter
 from rumor_centrality.graph_visualization import plot_nx_graph
 from rumor_centrality.rumor_detection import get_center_prediction
 from rumor_centrality.rumor_detection import get_edge_list_from_adj_list
@@ -33,6 +37,63 @@ def get_induced_subgraph(adj_list: Dict[int, List[int]], subgraph_assignments: D
     return subgraphs
 
 
+def partition_adj_list(adj_list: Dict[int, List[int]], subgraph_assignments: Dict[int, int],
+                       compact_views: bool = False) -> List[Dict[int, List[int]]]:
+    """Splits the adj list into one subgraph per cluster in a single pass over all nodes and edges.
+    Unlike get_induced_subgraph, each subgraph only contains its member nodes and their intra-cluster edges.
+
+    With compact_views the subgraphs are CompactGraphs whose arrays are views into one shared csr structure."""
+    if compact_views:
+        return _partition_compact_graph(
+            adj_list if isinstance(adj_list, CompactGraph) else CompactGraph.from_adj_list(adj_list),
+            subgraph_assignments)
+
+    subgraphs = {i: {} for i in set(subgraph_assignments.values())}
+    for cur_node, neighbors in adj_list.items():
+        i = subgraph_assignments[cur_node]
+        subgraphs[i][cur_node] = [next_node for next_node in neighbors if subgraph_assignments[next_node] == i]
+
+    return list(subgraphs.values())
+
+
+def _partition_compact_graph(g: CompactGraph, subgraph_assignments: Dict[int, int]) -> List[CompactGraph]:
+    cluster_ids = list(set(subgraph_assignments.values()))
+    cluster_index = {cluster_id: i for i, cluster_id in enumerate(cluster_ids)}
+    clusters = np.fromiter((cluster_index[subgraph_assignments[label]] for label in g.labels), dtype=np.int64,
+                           count=len(g.labels))
+
+    # Nodes are reordered so that every cluster is one contiguous block
+    order = np.argsort(clusters, kind="stable")
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    node_offsets = np.zeros(len(cluster_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(clusters, minlength=len(cluster_ids)), out=node_offsets[1:])
+
+    sources = np.repeat(np.arange(len(g.labels), dtype=np.int64), g.degrees())
+    targets = g.indices.astype(np.int64)
+    inside = clusters[sources] == clusters[targets]
+    sources, targets = sources[inside], targets[inside]
+    edge_order = np.argsort(position[sources], kind="stable")
+    sources, targets = sources[edge_order], targets[edge_order]
+
+    # Neighbors are stored as indices local to their cluster, with one local indptr block per cluster
+    indices = (position[targets] - node_offsets[clusters[targets]]).astype(g.indices.dtype)
+    degrees = np.bincount(position[sources], minlength=len(order))
+    indptr = np.zeros(len(order) + len(cluster_ids), dtype=np.int64)
+    labels = [g.labels[i] for i in order.tolist()]
+
+    subgraphs = []
+    edge_start = 0
+    for i in range(len(cluster_ids)):
+        start, end = node_offsets[i], node_offsets[i + 1]
+        block = indptr[start + i:end + i + 1]
+        np.cumsum(degrees[start:end], out=block[1:])
+        subgraphs.append(CompactGraph(block, indices[edge_start:edge_start + block[-1]], labels[start:end]))
+        edge_start += block[-1]
+
+    return subgraphs
+
+
 def get_node_indices_by_value(subgraph_assignments: Dict[int, int]) -> defaultdict[Any, list]:
     clusters = defaultdict(list)
     for node, cluster_num in subgraph_assignments.items():
@@ -48,77 +109,200 @@ def get_biggest_connected_component_subgraph_from_adj_list(adj_list: dict[int, l
     return G.subgraph(max(nx.connected_components(G), key=len))
 
 
-def get_max_infection_radius(gs: Iterator[Dict[int, List[int]]]) -> int:
+def get_max_infection_radius(gs: Iterator[Dict[int, List[int]]], diameter_mode: str = "exact") -> int:
+    """Largest diameter of the biggest connected component of all subgraphs, see graph_distances.diameter"""
     try:
         connected_nx_graphs = list(map(get_biggest_connected_component_subgraph_from_adj_list, gs))
-        return max(map(lambda x: diameter(x), connected_nx_graphs))
+        return max(map(lambda x: diameter(x, diameter_mode), connected_nx_graphs))
     except Exception:
         print("A Problem occured when finding max, returning 5")
         return 5
 
 
-def get_cluster_reprs(g: nx.Graph, number_clusters: int) -> List[int]:
+def _distances(g, source) -> Dict[int, int]:
+    """Hop distances from source, for networkx graphs and adj list Mappings such as CompactGraph"""
+    return single_source_shortest_path_length(g, source) if isinstance(g, nx.Graph) else bfs(g, source)[0]
+
+
+def _adj_list(g) -> Dict[int, List[int]]:
+    """g as adj list, a CompactGraph already is one"""
+    return g if isinstance(g, CompactGraph) else networkx_graph_to_adj_list(g)
+
+
+def _double_sweep(g: nx.Graph, start) -> Tuple[int, int, Dict[int, int]]:
+    """Returns the farthest node a from start, the farthest node b from a and the distances from a"""
+    dist_start = _distances(g, start)
+    a = max(dist_start, key=dist_start.get)
+    dist_a = _distances(g, a)
+    b = max(dist_a, key=dist_a.get)
+    return a, b, dist_a
+
+
+def get_cluster_reprs(g: nx.Graph, number_clusters: int, seed_selection: str = "periphery",
+                      sweeps: int = 3, rng: random.Random = None) -> List[int]:
+    """Selects number_clusters (at least two) nodes that are far away from each other.
+
+    seed_selection decides how the first two representatives are found:
+    "periphery" samples them from the periphery of g, which needs the eccentricity of every node,
+    "double_sweep" takes the farthest node b from the farthest node a of a random node (two BFS),
+    "random_sweeps" runs the double sweep from sweeps random nodes and keeps the farthest pair.
+    With the sweeps every further representative is the node farthest from its nearest representative,
+    tracked in a running min distance dict that is updated by one BFS per new representative.
+    Random choices are drawn from rng, or from the global random state without rng.
+    g can be a networkx graph or a CompactGraph, as in all clustering functions."""
+    rng = rng or random
+    if seed_selection in ("double_sweep", "random_sweeps"):
+        return _get_cluster_reprs_by_sweeps(g, number_clusters, 1 if seed_selection == "double_sweep" else sweeps, rng)
+    if seed_selection != "periphery":
+        raise ValueError(f"Unknown seed selection {seed_selection}")
+
     # select nodes that are the farthest away from each other (and are infected)
-    peripheral_nodes = periphery(g)
-    cluster_reprs = random.sample(peripheral_nodes, k=2)
+    peripheral_nodes = periphery(g.to_networkx() if isinstance(g, CompactGraph) else g)
+    cluster_reprs = rng.sample(peripheral_nodes, k=2)
 
-    dist_x = single_source_shortest_path_length(g, cluster_reprs[0])
-    dist_y = single_source_shortest_path_length(g, cluster_reprs[1])
+    dist_x = _distances(g, cluster_reprs[0])
+    dist_y = _distances(g, cluster_reprs[1])
     summed_dists = {k: dist_x.get(k, 0) + dist_y.get(k, 0) for k in (set(dist_x) & set(dist_y) - set(cluster_reprs))}
     for k in range(2, number_clusters):
         # select node which is farthest away from currently selected nodes
         # sum distances from each node from set
         max_node = sorted(summed_dists.items(), key=lambda x: x[1], reverse=True)[0]
         cluster_reprs.append(max_node[0])
-        dist_new = single_source_shortest_path_length(g, cluster_reprs[1])
+        dist_new = _distances(g, cluster_reprs[1])
         summed_dists = {k: dist_x.get(k, 0) + dist_y.get(k, 0) for k in
                         (set(summed_dists) & set(dist_new) - set(cluster_reprs))}
 
     return cluster_reprs
 
 
-def assign_all_nodes_cluster(g: nx.Graph, cluster_reprs: List[int]) -> Dict[int, int]:
+def _get_cluster_reprs_by_sweeps(g: nx.Graph, number_clusters: int, sweeps: int, rng: random.Random) -> List[int]:
+    nodes = list(g)
+    best_a, best_b, best_dist_a = None, None, None
+    for start in rng.sample(nodes, k=min(sweeps, len(nodes))):
+        a, b, dist_a = _double_sweep(g, start)
+        if best_dist_a is None or dist_a[b] > best_dist_a[best_b]:
+            best_a, best_b, best_dist_a = a, b, dist_a
+
+    cluster_reprs = [best_a, best_b]
+    min_dists = best_dist_a
+    while len(cluster_reprs) < number_clusters:
+        # Only the distances needed to pick the next representative are updated
+        dist_new = _distances(g, cluster_reprs[-1])
+        min_dists = {node: min(dist, dist_new.get(node, dist)) for node, dist in min_dists.items()}
+
+        # select node which is farthest away from its nearest selected node
+        cluster_reprs.append(max(min_dists, key=min_dists.get))
+
+    return cluster_reprs
+
+
+def assign_all_nodes_cluster(g: nx.Graph, cluster_reprs: List[int], rng: random.Random = None) -> Dict[int, int]:
     """Given a graph g and a list of vertices that are the cluster representatives,
-    assigns all nodes in g to a cluster and returns those assignments as a dict"""
+    assigns all nodes in g to a cluster and returns those assignments as a dict
+
+    Uses one multi-source BFS from all representatives. Each BFS level passes on the set of nearest
+    representatives, a node tied between several of them is assigned to one of them at random (drawn from rng)."""
+    rng = rng or random
 
-    dists = {cluster_repr: single_source_shortest_path_length(g, cluster_repr) for cluster_repr in cluster_reprs}
     packed_cluster_labels = {cluster_label: i for i, cluster_label in enumerate(set(cluster_reprs))}
-    cluster_assign = {}
+    nearest_reprs = {cluster_repr: {cluster_repr} for cluster_repr in cluster_reprs}
+    cluster = {cluster_repr: cluster_repr for cluster_repr in cluster_reprs}
 
-    for node in g:
-        min_dist_cluster = None
-        nodes = cluster_reprs.copy()
-        random.shuffle(nodes)
-        for idx in nodes:
-            if min_dist_cluster is None or dists[idx][node] < dists[min_dist_cluster][node]:
-                min_dist_cluster = idx
+    frontier = list(nearest_reprs)
+    while len(frontier) > 0:
+        next_level = {}
+        for node in frontier:
+            for neighbor in g[node]:
+                if neighbor not in nearest_reprs:
+                    next_level.setdefault(neighbor, set()).update(nearest_reprs[node])
 
-        cluster_assign[node] = packed_cluster_labels[min_dist_cluster]
+        for node, reprs in next_level.items():
+            cluster[node] = next(iter(reprs)) if len(reprs) == 1 else rng.choice(sorted(reprs))
+        nearest_reprs.update(next_level)
+        frontier = list(next_level)
 
-    return cluster_assign
+    return {node: packed_cluster_labels[cluster[node]] for node in g}
 
 
-def cluster_graph(g: nx.Graph, number_clusters: int) -> Dict[int, int]:
-    reprs = get_cluster_reprs(g, number_clusters)
-    assignm = assign_all_nodes_cluster(g, reprs)
+def cluster_graph(g: nx.Graph, number_clusters: int, seed_selection: str = "periphery",
+                  rng: random.Random = None) -> Dict[int, int]:
+    reprs = get_cluster_reprs(g, number_clusters, seed_selection, rng=rng)
+    assignm = assign_all_nodes_cluster(g, reprs, rng)
     return assignm
 
 
-def build_cluster(g: nx.Graph, number_clusters: int) -> tuple[int, list[dict[int, list[int]]], dict[int, int]]:
-    assignm = cluster_graph(g, number_clusters)
-    adj_list = networkx_graph_to_adj_list(g)
-    subgraphs = get_induced_subgraph(adj_list, assignm)
+def build_cluster(g: nx.Graph, number_clusters: int, seed_selection: str = "periphery",
+                  rng: random.Random = None) -> tuple[int, list[dict[int, list[int]]], dict[int, int]]:
+    assignm = cluster_graph(g, number_clusters, seed_selection, rng)
+    subgraphs = partition_adj_list(_adj_list(g), assignm)
     max_infection_radius = get_max_infection_radius(list(subgraphs))
 
     return max_infection_radius, subgraphs, assignm
 
 
+def estimate_cluster_count(g: nx.Graph, max_num_clusters: int, rng: random.Random = None,
+                           seed_selection: str = "double_sweep") \
+        -> Tuple[int, List[int], List[int], List[List[int]]]:
+    """Estimates the number of clusters at the elbow of the cluster radius curve, argmax wk - wk+1 - (wk+1 - wk+2).
+
+    The first two representatives are chosen by seed_selection as in get_cluster_reprs, every further one is the
+    node farthest from its nearest representative. One BFS per new representative updates the distance to and the
+    index of the nearest representative of every node, which give the radius of every cluster. wk is the largest
+    cluster radius with k representatives, so the curve is known for every k = 1..max_num_clusters at the cost of
+    a single clustering. Unlike the clustering per k of multiple_rumor_source_prediction with
+    incremental_estimation disabled, the curve is based on cluster radii instead of cluster diameters.
+    Returns the estimated number of clusters, its representatives, the curve wk and the cluster radii for every k."""
+    first_reprs = get_cluster_reprs(g, 2, seed_selection, rng=rng)
+    cluster_reprs = [first_reprs[0]]
+    min_dists = _distances(g, first_reprs[0])
+    nearest = dict.fromkeys(min_dists, 0)
+    cluster_radii = [[max(min_dists.values())]]
+
+    while len(cluster_reprs) < max_num_clusters:
+        new_repr = first_reprs[1] if len(cluster_reprs) == 1 else max(min_dists, key=min_dists.get)
+        cluster_reprs.append(new_repr)
+        for node, dist in _distances(g, new_repr).items():
+            if dist < min_dists[node]:
+                min_dists[node] = dist
+                nearest[node] = len(cluster_reprs) - 1
+
+        radii = [0] * len(cluster_reprs)
+        for node, dist in min_dists.items():
+            if dist > radii[nearest[node]]:
+                radii[nearest[node]] = dist
+        cluster_radii.append(radii)
+
+    # radius_curve[k - 1] is wk, at least two clusters are built as in get_cluster_reprs
+    radius_curve = [max(radii) for radii in cluster_radii]
+    computed_diffs = [
+        (radius_curve[k - 1] - radius_curve[k] - (radius_curve[k] - radius_curve[k + 1]), k)
+        for k in range(2, len(radius_curve) - 1)]
+    best_k = max(computed_diffs, key=lambda x: x[0])[1] if len(computed_diffs) > 0 else len(cluster_reprs)
+
+    return best_k, cluster_reprs[:best_k], radius_curve, cluster_radii
+
+
 def multiple_rumor_source_prediction(g: nx.Graph, max_num_clusters: int = 20,
-                                     estimate_num_cluster: bool = False) -> Tuple[List[List[int]], Dict[int, int]]:
-    """Main method for multiple center prediction, uses always rumor centrality"""
-    if estimate_num_cluster:
+                                     estimate_num_cluster: bool = False,
+                                     seed_selection: str = "periphery",
+                                     incremental_estimation: bool = True,
+                                     rng: random.Random = None) -> Tuple[List[List[int]], Dict[int, int]]:
+    """Main method for multiple center prediction, uses always rumor centrality
+
+    With estimate_num_cluster the number of clusters is estimated by estimate_cluster_count, which picks the first
+    representatives by seed_selection and the further ones farthest first, and takes the elbow of the cluster radius
+    curve. If incremental_estimation is disabled the graph is clustered for every number of clusters instead and the
+    elbow of the largest cluster diameter is taken, which is slower and gives different clusterings."""
+    if estimate_num_cluster and incremental_estimation:
+        _, cluster_reprs, _, _ = estimate_cluster_count(g, max_num_clusters, rng, seed_selection)
+        assignm = assign_all_nodes_cluster(g, cluster_reprs, rng)
+        subgraphs = partition_adj_list(_adj_list(g), assignm)
+        subgraphs_rumor_centers = list(map(lambda x: get_center_prediction(x), subgraphs))
+
+        return subgraphs_rumor_centers, assignm
+    elif estimate_num_cluster:
         # argmax wk - wk+1 - (wk+1 - wk+2)
-        clusters_dists = [build_cluster(g, k) for k in range(max_num_clusters)]
+        clusters_dists = [build_cluster(g, k, seed_selection, rng) for k in range(max_num_clusters)]
         computed_diffs = [
             (clusters_dists[k][0] - clusters_dists[k + 1][0] - (clusters_dists[k + 1][0] - clusters_dists[k + 2][0]), k)
             for
@@ -129,34 +313,71 @@ def multiple_rumor_source_prediction(g: nx.Graph, max_num_clusters: int = 20,
 
         return subgraphs_rumor_centers, clusters_dists[best_cluster[1]][2]
     else:
-        max_infection_radius, subgraphs, assignm = build_cluster(g, max_num_clusters)
+        max_infection_radius, subgraphs, assignm = build_cluster(g, max_num_clusters, seed_selection, rng)
         subgraphs_rumor_centers = list(map(lambda x: get_center_prediction(x), subgraphs))
 
         return subgraphs_rumor_centers, assignm
 
 
+def _cluster_subgraphs(g: nx.Graph, max_num_clusters: int, seed_selection: str,
+                       rng: random.Random = None) -> Tuple[List[Dict[int, List[int]]], Dict[int, int]]:
+    if max_num_clusters == 1:
+        return [_adj_list(g)], None
+
+    assignm = cluster_graph(g, max_num_clusters, seed_selection, rng)
+    return partition_adj_list(_adj_list(g), assignm), assignm
+
+
 def multiple_rumor_source_prediction_metric(
         g: nx.Graph,
         max_num_clusters: int = 20,
         center_prediction_callback=get_center_prediction,
         callback_runs_on_nxgraph=False,
+        seed_selection: str = "periphery",
+        rng: random.Random = None,
 ) -> Tuple[List[List[int]], Dict[int, int]]:
     """Main method for multiple center prediction,
     takes a cluster center prediction method as `center_prediction_callback`"""
+    predictions, assignm = multiple_rumor_source_prediction_metrics(
+        g, {None: (center_prediction_callback, callback_runs_on_nxgraph)}, max_num_clusters, seed_selection,
+        rng=rng)
 
-    if max_num_clusters == 1:
-        subgraphs, assignm = [networkx_graph_to_adj_list(g)], None
-    else:
-        max_infection_radius, subgraphs, assignm = build_cluster(g, max_num_clusters)
+    return predictions[None], assignm
 
-    if callback_runs_on_nxgraph:
-        subgraphs_rumor_centers = list(map(lambda x: center_prediction_callback(
-            get_biggest_connected_component_subgraph_from_adj_list(x)
-        ), subgraphs))
-    else:
-        subgraphs_rumor_centers = list(map(lambda x: center_prediction_callback(x), subgraphs))
 
-    return subgraphs_rumor_centers, assignm
+def multiple_rumor_source_prediction_metrics(
+        g: nx.Graph,
+        center_prediction_callbacks: Dict[Any, Tuple[Callable, bool]],
+        max_num_clusters: int = 20,
+        seed_selection: str = "periphery",
+        prediction_runner: Callable = None,
+        rng: random.Random = None,
+) -> Tuple[Dict[Any, Optional[List[List[int]]]], Dict[int, int]]:
+    """multiple_rumor_source_prediction_metric for several metrics on one clustering of g.
+
+    center_prediction_callbacks maps a metric name to (center_prediction_callback, callback_runs_on_nxgraph).
+    The subgraphs are built once, and converted to networkx graphs once for all callbacks running on them.
+    prediction_runner(function, args) can wrap the prediction of each metric, e.g. to limit its runtime,
+    if it returns None the metric is skipped and its predictions are None.
+    The clustering draws its random choices from rng.
+    Returns the predicted centers of every subgraph by metric name and the cluster assignment."""
+    subgraphs, assignm = _cluster_subgraphs(g, max_num_clusters, seed_selection, rng)
+    nx_subgraphs = None
+
+    predictions = {}
+    for name, (center_prediction_callback, callback_runs_on_nxgraph) in center_prediction_callbacks.items():
+        if callback_runs_on_nxgraph and nx_subgraphs is None:
+            nx_subgraphs = list(map(get_biggest_connected_component_subgraph_from_adj_list, subgraphs))
+        inputs = nx_subgraphs if callback_runs_on_nxgraph else subgraphs
+
+        predict = partial(_predict_centers, center_prediction_callback, inputs)
+        predictions[name] = predict() if prediction_runner is None else prediction_runner(predict, ())
+
+    return predictions, assignm
+
+
+def _predict_centers(center_prediction_callback: Callable, subgraphs: List) -> List[List[int]]:
+    return list(map(lambda x: center_prediction_callback(x), subgraphs))
 
 
 def visualise_cluster_graph(g: nx.Graph, rumor_centers: List[List[int]], assignment: Dict[int, int],
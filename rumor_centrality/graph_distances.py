@@ -0,0 +1,225 @@
+"""BFS based distance measures for unweighted graphs, exact with pruning or approximated by sweeps
+
+All functions take a networkx graph or an adj list dict node -> neighbors."""
+import hashlib
+import heapq
+import itertools
+import random
+from collections import OrderedDict
+from typing import Dict, Tuple, Any, List
+
+import networkx as nx
+
+
+def bfs(g, source) -> Tuple[Dict[Any, int], Dict[Any, Any]]:
+    """Distances and bfs tree parents of all nodes reachable from source"""
+    dists = {source: 0}
+    parents = {source: None}
+    frontier = [source]
+    level = 0
+    while len(frontier) > 0:
+        level += 1
+        next_frontier = []
+        for node in frontier:
+            for neighbor in g[node]:
+                if neighbor not in dists:
+                    dists[neighbor] = level
+                    parents[neighbor] = node
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return dists, parents
+
+
+def _checked_bfs(g, source) -> Tuple[Dict[Any, int], Dict[Any, Any]]:
+    dists, parents = bfs(g, source)
+    if len(dists) != len(g):
+        raise nx.NetworkXError("Found infinite path length because the graph is not connected")
+    return dists, parents
+
+
+def _farthest(dists: Dict[Any, int]):
+    return max(dists, key=dists.get)
+
+
+def _path_middle(parents: Dict[Any, Any], end):
+    path = [end]
+    while parents[path[-1]] is not None:
+        path.append(parents[path[-1]])
+    return path[len(path) // 2]
+
+
+def double_sweep_diameter(g, sweeps: int = 2, rng: random.Random = None) -> int:
+    """Lower bound of the diameter: the eccentricity of the farthest node from a random node (drawn from rng),
+    best of sweeps tries. Exact on trees and usually exact or off by one on sparse graphs."""
+    lower_bound = 0
+    for start in (rng or random).sample(list(g), k=min(sweeps, len(g))):
+        far = _farthest(_checked_bfs(g, start)[0])
+        dists, _ = bfs(g, far)
+        lower_bound = max(lower_bound, dists[_farthest(dists)])
+    return lower_bound
+
+
+def ifub_diameter(g) -> int:
+    """Exact diameter by iFUB (iterative fringe upper bound).
+
+    A BFS from a central node u found by a double sweep groups the nodes by distance to u. Going outward in,
+    the eccentricities of the nodes of level i are computed until the best lower bound exceeds 2 * (i - 1),
+    the upper bound of the diameter through the remaining levels. This usually needs only a few BFS."""
+    start = next(iter(g))
+    a = _farthest(_checked_bfs(g, start)[0])
+    dists_a, parents_a = bfs(g, a)
+    b = _farthest(dists_a)
+    lower_bound = dists_a[b]
+
+    u = _path_middle(parents_a, b)
+    dists_u, _ = bfs(g, u)
+    levels: Dict[int, List[Any]] = {}
+    for node, dist in dists_u.items():
+        levels.setdefault(dist, []).append(node)
+
+    level = max(levels)
+    lower_bound = max(lower_bound, level)
+    upper_bound = 2 * level
+    while upper_bound > lower_bound:
+        for node in levels[level]:
+            dists, _ = bfs(g, node)
+            lower_bound = max(lower_bound, max(dists.values()))
+        if lower_bound > 2 * (level - 1):
+            return lower_bound
+        upper_bound = 2 * (level - 1)
+        level -= 1
+
+    return lower_bound
+
+
+def graph_fingerprint(g) -> str:
+    """Hash of the node and edge set of an undirected graph, independent of insertion order"""
+    if isinstance(g, nx.Graph):
+        nodes, edges = g.nodes, g.edges
+    else:
+        nodes, edges = g.keys(), ((node, neighbor) for node in g for neighbor in g[node])
+    normalized_edges = sorted({(u, v) if repr(u) <= repr(v) else (v, u) for u, v in edges}, key=repr)
+    content = repr((sorted(nodes, key=repr), normalized_edges))
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+_exact_diameter_cache = OrderedDict()
+_EXACT_DIAMETER_CACHE_SIZE = 1024
+
+
+def diameter(g, mode: str = "exact", rng: random.Random = None) -> int:
+    """Diameter of a connected graph.
+
+    "exact" uses ifub_diameter, the result is cached per graph fingerprint.
+    "approximate" uses double_sweep_diameter with start nodes drawn from rng, which can underestimate the diameter."""
+    if mode == "approximate":
+        return double_sweep_diameter(g, rng=rng)
+    if mode != "exact":
+        raise ValueError(f"Unknown diameter mode {mode}")
+
+    fingerprint = graph_fingerprint(g)
+    if fingerprint in _exact_diameter_cache:
+        _exact_diameter_cache.move_to_end(fingerprint)
+        return _exact_diameter_cache[fingerprint]
+
+    result = ifub_diameter(g)
+    _exact_diameter_cache[fingerprint] = result
+    if len(_exact_diameter_cache) > _EXACT_DIAMETER_CACHE_SIZE:
+        _exact_diameter_cache.popitem(last=False)
+    return result
+
+
+def _tighten_eccentricity_bounds(g, candidates, lower: Dict[Any, int], upper: Dict[Any, int],
+                                 smallest_lower: bool) -> None:
+    """One BFS from the candidate with the smallest lower (or the largest upper) bound v, which tightens the bounds
+    of every candidate in distance d to max(d, e - d) and e + d with e the eccentricity of v"""
+    if smallest_lower:
+        v = min(candidates, key=lower.get)
+    else:
+        v = max(candidates, key=upper.get)
+
+    dists, _ = _checked_bfs(g, v)
+    eccentricity = max(dists.values())
+    for w in candidates:
+        d = dists[w]
+        lower[w] = max(lower[w], d, eccentricity - d)
+        upper[w] = min(upper[w], eccentricity + d)
+    lower[v] = upper[v] = eccentricity
+
+
+def center(g, candidates=None) -> List[Any]:
+    """Exact center (nodes of minimal eccentricity) of a connected graph, in node order of g.
+
+    Keeps a lower and an upper eccentricity bound per node, which every BFS from a node v with
+    eccentricity e tightens to max(d, e - d) and e + d for a node in distance d. Nodes whose lower bound
+    exceeds the smallest upper bound can not be in the center, nodes with equal bounds are resolved.
+    BFS alternate between the candidates with the smallest lower and the largest upper bound,
+    until no candidate is left. With candidates only those nodes are considered for the center."""
+    candidates = set(g) if candidates is None else set(candidates)
+    lower = dict.fromkeys(candidates, 0)
+    upper = dict.fromkeys(candidates, float("inf"))
+    min_upper = float("inf")
+
+    smallest_lower = True
+    while len(candidates) > 0:
+        _tighten_eccentricity_bounds(g, candidates, lower, upper, smallest_lower)
+        smallest_lower = not smallest_lower
+
+        min_upper = min(min_upper, min(upper[w] for w in candidates))
+        candidates = {w for w in candidates if lower[w] <= min_upper and lower[w] != upper[w]}
+
+    return [node for node in g if node in upper and lower[node] == upper[node] == min_upper]
+
+
+def peeling_center(g) -> List[Any]:
+    """Approximate center by iteratively removing all leaves, which is exact on trees.
+    If leaves run out before at most two nodes remain, the center is searched among the remaining core only."""
+    degrees = {node: len(g[node]) for node in g}
+    remaining = set(g)
+    leaves = [node for node, degree in degrees.items() if degree <= 1]
+
+    while len(remaining) > 2 and len(leaves) > 0:
+        if len(leaves) == len(remaining):
+            return [node for node in g if node in leaves]
+
+        next_leaves = []
+        for leaf in leaves:
+            remaining.discard(leaf)
+        for leaf in leaves:
+            for neighbor in g[leaf]:
+                if neighbor in remaining:
+                    degrees[neighbor] -= 1
+                    if degrees[neighbor] == 1:
+                        next_leaves.append(neighbor)
+        leaves = next_leaves
+
+    if len(remaining) <= 2:
+        return [node for node in g if node in remaining]
+    return center(g, remaining)
+
+
+def smallest_eccentricities(g, k: int) -> List[Tuple[Any, int]]:
+    """The k nodes of smallest eccentricity of a connected graph with their eccentricities, ties in node order of g.
+
+    Uses the eccentricity bounds of center, but nodes are only pruned once their lower bound exceeds the k-th
+    smallest upper bound. The search stops as soon as the bounds settle the k smallest eccentricities."""
+    candidates = set(g)
+    lower = dict.fromkeys(candidates, 0)
+    upper = dict.fromkeys(candidates, float("inf"))
+    resolved = {}
+
+    smallest_lower = True
+    while len(candidates) > 0:
+        _tighten_eccentricity_bounds(g, candidates, lower, upper, smallest_lower)
+        smallest_lower = not smallest_lower
+
+        for w in [w for w in candidates if lower[w] == upper[w]]:
+            resolved[w] = lower[w]
+            candidates.discard(w)
+
+        kth_upper = heapq.nsmallest(k, itertools.chain(
+            resolved.values(), (upper[w] for w in candidates)))[-1]
+        candidates = {w for w in candidates if lower[w] <= kth_upper}
+
+    position = {node: i for i, node in enumerate(g)}
+    return heapq.nsmallest(k, resolved.items(), key=lambda item: (item[1], position[item[0]]))
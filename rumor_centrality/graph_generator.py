@@ -1,6 +1,17 @@
 """Utility to generate graphs and to load graphs from datasets"""
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Tuple, Optional
 
 import networkx as nx
+import numpy as np
+
+from rumor_centrality.compact_graph import CompactGraph
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CACHE_DIR = DATA_DIR / ".cache"
 
 
 small_world = nx.watts_strogatz_graph
@@ -10,9 +21,63 @@ scale_free = nx.scale_free_graph
 synthetic_internet = nx.generators.random_internet_as_graph
 
 
+def load_edge_arrays(file_name: str, weighted: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Loads the edge list data/file_name as int array of shape (m, 2) and, if weighted, the float weights.
+
+    The text file is only parsed once, the arrays are cached as .npz in data/.cache keyed by the hash of
+    the file content. Within a process the arrays are additionally kept in memory and are read-only."""
+    path = DATA_DIR / file_name
+    stat = path.stat()
+    return _load_edge_arrays(path, stat.st_mtime_ns, stat.st_size, weighted)
+
+
+@lru_cache(maxsize=None)
+def _load_edge_arrays(path: Path, mtime_ns: int, size: int, weighted: bool) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    content_hash = hashlib.sha1(path.read_bytes()).hexdigest()[:16]
+    cache_path = CACHE_DIR / f"{path.stem}-{content_hash}.npz"
+
+    if cache_path.exists():
+        with np.load(cache_path) as cached:
+            edges, weights = cached["edges"], cached["weights"]
+    else:
+        columns = np.loadtxt(path, comments="#", ndmin=2)
+        edges = columns[:, :2].astype(np.int64)
+        weights = columns[:, 2] if columns.shape[1] > 2 else np.ones(len(edges))
+
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp.npz")
+            np.savez(tmp_path, edges=edges, weights=weights)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # The cache is only an optimization, a read-only data dir is fine
+            pass
+
+    edges.flags.writeable = False
+    weights.flags.writeable = False
+    return edges, weights if weighted else None
+
+
+def _graph_from_edge_arrays(edges: np.ndarray, weights: Optional[np.ndarray]) -> nx.Graph:
+    g = nx.Graph()
+    if weights is None:
+        g.add_edges_from(edges.tolist())
+    else:
+        g.add_weighted_edges_from((u, v, w) for (u, v), w in zip(edges.tolist(), weights.tolist()))
+    return g
+
+
 def internet():
-    return nx.read_edgelist("./data/as20000102.txt", create_using=nx.Graph(), nodetype=int)
+    return _graph_from_edge_arrays(*load_edge_arrays("as20000102.txt"))
 
 
 def us_power_grid():
-    return nx.read_edgelist("./data/uspowergrid.txt", create_using=nx.Graph(), nodetype=int, data=(("weight", float),))
+    return _graph_from_edge_arrays(*load_edge_arrays("uspowergrid.txt", weighted=True))
+
+
+def internet_compact() -> CompactGraph:
+    return CompactGraph.from_edge_list(load_edge_arrays("as20000102.txt")[0])
+
+
+def us_power_grid_compact() -> CompactGraph:
+    return CompactGraph.from_edge_list(load_edge_arrays("uspowergrid.txt")[0])
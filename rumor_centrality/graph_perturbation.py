@@ -0,0 +1,43 @@
+"""Utility to perturb infection graphs, e.g. to simulate infected nodes missing from the observation"""
+import random
+from typing import List, Dict, Set, Any
+
+import networkx as nx
+
+
+def remove_nodes_and_reconnect_adj(adj: Dict[Any, Set[Any]], nodes_to_remove: List[Any]) -> None:
+    """Removes the nodes from the dict of sets adjacency in the given order
+    and connects the neighbors of each removed node to a clique. adj is modified in-place."""
+    for node in nodes_to_remove:
+        neighbors = adj.pop(node)
+        neighbors.discard(node)
+        for neighbor in neighbors:
+            neighbor_set = adj[neighbor]
+            neighbor_set.discard(node)
+            # Sets skip edges which are already there, so no edge is inserted twice
+            neighbor_set.update(other for other in neighbors if other != neighbor)
+
+
+def remove_nodes_and_reconnect(g: nx.Graph, percent_missing: float,
+                               rng: random.Random = None) -> (nx.Graph, List[Any]):
+    """Removes int(n * percent_missing) random nodes (drawn from rng) from g one after another and reconnects the
+    neighbors of every removed node to a clique. Neighbors gained by earlier reconnections are reconnected as well.
+    Returns the reduced graph and the removed nodes in removal order. g is not modified."""
+    nodes = list(g.nodes)
+    removed_nodes = (rng or random).sample(nodes, int(len(nodes) * percent_missing))
+
+    adj = {node: set(g.adj[node]) for node in nodes}
+    remove_nodes_and_reconnect_adj(adj, removed_nodes)
+
+    return graph_from_adj(adj), removed_nodes
+
+
+def graph_from_adj(adj: Dict[Any, Set[Any]]) -> nx.Graph:
+    """networkx graph of a symmetric dict of sets adjacency, keeping the node order"""
+    position = {node: i for i, node in enumerate(adj)}
+    g = nx.Graph()
+    g.add_nodes_from(adj)
+    g.add_edges_from(
+        (node, neighbor) for node, neighbors in adj.items() for neighbor in neighbors
+        if position[node] <= position[neighbor])
+    return g
@@ -1,9 +1,13 @@
 """Utility to simulate different infection spread dynamics on a graph"""
 import random
-from typing import List
+from typing import List, Set, Tuple
 
 import networkx as nx
+import numpy as np
 from ndlib.models import ModelConfig
+
+from rumor_centrality.compact_graph import CompactGraph
+from rumor_centrality.seeding import numpy_seed
 from ndlib.models.epidemics import SIModel, SISModel, SIRModel, SEIRModel, SEIRctModel, SEISModel, SEISctModel
 
 
@@ -14,11 +18,14 @@ def si(
         infections_centers: int,
         max_infected_nodes: int = -1,
         max_no_change: int = -1,
-        fill_infection_count: bool = False
+        fill_infection_count: bool = False,
+        rng: random.Random = None,
 ) -> (nx.Graph, List[int]):
+    """SI simulation with ndlib. With rng the sources, the simulation and the filled infections are drawn from rng
+    (see seeding), otherwise from the global random states"""
 
     nodes = list(graph.nodes.keys())
-    random.shuffle(nodes)
+    (rng or random).shuffle(nodes)
     infected_nodes = nodes[:infections_centers]
 
     return _run_model(
@@ -32,6 +39,7 @@ def si(
         ("beta", infection_prob),
         # ("fraction_infected", infections_centers / graph.number_of_nodes()))
         Infected=infected_nodes,
+        rng=rng,
     )
 
 
@@ -43,7 +51,8 @@ def sis(
         infections_centers: int,
         max_infected_nodes: int = -1,
         max_no_change: int = -1,
-        fill_infection_count: bool = False
+        fill_infection_count: bool = False,
+        rng: random.Random = None,
 ) -> (nx.Graph, List[int]):
     return _run_model(
         SISModel,
@@ -55,7 +64,9 @@ def sis(
         fill_infection_count,
         ("beta", infection_prob),
         ("lambda", recovery_prob),
-        ("fraction_infected", infections_centers / graph.number_of_nodes()))
+        ("fraction_infected", infections_centers / graph.number_of_nodes()),
+        rng=rng,
+    )
 
 
 def sir(
@@ -67,7 +78,8 @@ def sir(
         max_infected_nodes: int = -1,
         recovered_are_infected=True,
         max_no_change: int = -1,
-        fill_infection_count: bool = False
+        fill_infection_count: bool = False,
+        rng: random.Random = None,
 ) -> (nx.Graph, List[int]):
     return _run_model(
         SIRModel,
@@ -79,7 +91,9 @@ def sir(
         fill_infection_count,
         ("beta", infection_prob),
         ("gamma", removal_prob),
-        ("fraction_infected", infections_centers / graph.number_of_nodes()))
+        ("fraction_infected", infections_centers / graph.number_of_nodes()),
+        rng=rng,
+    )
 
 
 def discrete_seir(
@@ -174,6 +188,317 @@ def continous_seis(
         ("fraction_infected", infections_centers / graph.number_of_nodes()))
 
 
+def native_si(
+        graph: nx.Graph,
+        iterations: int,
+        infection_prob: float,
+        infections_centers: int,
+        max_infected_nodes: int = -1,
+        max_no_change: int = -1,
+        fill_infection_count: bool = False,
+        rng: random.Random = None,
+) -> (nx.Graph, List[int]):
+    """Same as si, but simulated by the built-in frontier based engine instead of ndlib"""
+    return _run_native_model(
+        graph,
+        iterations,
+        infection_prob,
+        0.0,
+        None,
+        infections_centers,
+        max_infected_nodes,
+        max_no_change,
+        fill_infection_count,
+        rng=rng,
+    )
+
+
+def native_sis(
+        graph: nx.Graph,
+        iterations: int,
+        infection_prob: float,
+        recovery_prob: float,
+        infections_centers: int,
+        max_infected_nodes: int = -1,
+        max_no_change: int = -1,
+        fill_infection_count: bool = False,
+        rng: random.Random = None,
+) -> (nx.Graph, List[int]):
+    """Same as sis, but simulated by the built-in frontier based engine instead of ndlib"""
+    return _run_native_model(
+        graph,
+        iterations,
+        infection_prob,
+        recovery_prob,
+        _SUSCEPTIBLE,
+        infections_centers,
+        max_infected_nodes,
+        max_no_change,
+        fill_infection_count,
+        rng=rng,
+    )
+
+
+def native_sir(
+        graph: nx.Graph,
+        iterations: int,
+        infection_prob: float,
+        removal_prob: float,
+        infections_centers: int,
+        max_infected_nodes: int = -1,
+        recovered_are_infected=True,
+        max_no_change: int = -1,
+        fill_infection_count: bool = False,
+        rng: random.Random = None,
+) -> (nx.Graph, List[int]):
+    """Same as sir, but simulated by the built-in frontier based engine instead of ndlib"""
+    return _run_native_model(
+        graph,
+        iterations,
+        infection_prob,
+        removal_prob,
+        _REMOVED,
+        infections_centers,
+        max_infected_nodes,
+        max_no_change,
+        fill_infection_count,
+        recovered_are_infected,
+        rng,
+    )
+
+
+_SUSCEPTIBLE, _INFECTED, _REMOVED = 0, 1, 2
+
+
+def _run_native_model(
+        raw_graph,
+        iterations: int,
+        infection_prob: float,
+        recovery_prob: float,
+        recovered_state,
+        infections_centers: int,
+        max_infected_nodes: int,
+        max_no_change: int,
+        fill_infection_count: bool,
+        recovered_are_infected: bool = False,
+        rng: random.Random = None,
+) -> (nx.Graph, List[int]):
+    """
+        Simulates the infection spread like the ndlib SI, SIS and SIR models in discrete synchronous steps:
+        a susceptible node with k infected neighbors gets infected with 1 - (1 - infection_prob)^k,
+        an infected node moves to recovered_state with recovery_prob (never if recovered_state is None).
+        Only the frontier of susceptible nodes with infected neighbors and the infected nodes are visited per step.
+        As in ndlib, the first of the iterations only sets the initial infection, so iterations - 1 steps are spread.
+        If max_infected_nodes is reached, a random subset of the last step's infections is kept to hit it exactly.
+        The spread also stops when no further infection is possible, e.g. a cascade that infected its whole component.
+        Accepts a networkx graph or a CompactGraph and returns the infected subgraph of the same type
+        and the initial infected nodes. The input graph is not modified.
+        Random numbers are drawn from rng, or from the global random state without rng.
+    """
+    rng = rng or random
+
+    if (iterations < 0 and max_infected_nodes < 0) or (iterations > 0 and max_infected_nodes > 0):
+        raise AttributeError("Either limited iterations or limited infections need to be specified")
+
+    compact = raw_graph if isinstance(raw_graph, CompactGraph) else CompactGraph.from_networkx(raw_graph)
+    adj = compact.adjacency_lists()
+    n = len(adj)
+
+    if max_infected_nodes > 0 and max_infected_nodes > n:
+        raise AttributeError("More max_infected_nodes than nodes in Graph")
+
+    # Recovered nodes count as infected only in SIR with recovered_are_infected
+    recovered_counts = recovered_state == _REMOVED and recovered_are_infected
+
+    status = [_SUSCEPTIBLE] * n
+    infected_neighbors = [0] * n
+    frontier = set()
+    infected = set()
+
+    def infect(u):
+        status[u] = _INFECTED
+        infected.add(u)
+        frontier.discard(u)
+        for w in adj[u]:
+            infected_neighbors[w] += 1
+            if status[w] == _SUSCEPTIBLE:
+                frontier.add(w)
+
+    def recover(u):
+        status[u] = recovered_state
+        infected.discard(u)
+        for w in adj[u]:
+            infected_neighbors[w] -= 1
+            if infected_neighbors[w] == 0:
+                frontier.discard(w)
+        if recovered_state == _SUSCEPTIBLE and infected_neighbors[u] > 0:
+            frontier.add(u)
+
+    initial_infected = rng.sample(range(n), infections_centers)
+    for u in initial_infected:
+        infect(u)
+    total_infected = len(initial_infected)
+
+    # The first ndlib iteration only returns the initial status
+    step = 1
+    times_of_no_change = 0
+    while (iterations < 0 or step < iterations) and (max_infected_nodes < 0 or total_infected < max_infected_nodes):
+        # Without infected nodes nothing changes anymore, in SI neither without susceptible neighbors
+        if not infected or (recovered_state is None and not frontier):
+            break
+        step += 1
+        newly_infected = [u for u in frontier if rng.random() < 1 - (1 - infection_prob) ** infected_neighbors[u]]
+        recovered = [u for u in infected if rng.random() < recovery_prob] if recovered_state is not None else []
+
+        if len(newly_infected) == 0:
+            times_of_no_change += 1
+            if max_no_change != -1 and times_of_no_change > max_no_change:
+                break
+
+        total_after_recovery = total_infected - (0 if recovered_counts else len(recovered))
+        if max_infected_nodes > 0 and total_after_recovery + len(newly_infected) > max_infected_nodes:
+            rng.shuffle(newly_infected)
+            newly_infected = newly_infected[:max(0, max_infected_nodes - total_after_recovery)]
+
+        for u in recovered:
+            recover(u)
+        for u in newly_infected:
+            infect(u)
+        total_infected = total_after_recovery + len(newly_infected)
+
+    infected_nodes = [u for u in range(n) if status[u] == _INFECTED or (recovered_counts and status[u] == _REMOVED)]
+
+    if fill_infection_count and max_infected_nodes > 0 and len(infected_nodes) < max_infected_nodes:
+        infected_set = set(infected_nodes)
+        infection_neighbors = list({w for u in infected_nodes for w in adj[u]} - infected_set)
+        rng.shuffle(infection_neighbors)
+        infected_nodes.extend(infection_neighbors[:max_infected_nodes - len(infected_nodes)])
+
+    labels = [compact.labels[u] for u in infected_nodes]
+    infected_graph = compact.subgraph(labels) if isinstance(raw_graph, CompactGraph) else raw_graph.subgraph(labels).copy()
+
+    return infected_graph, [compact.labels[u] for u in initial_infected]
+
+
+def batch_si(
+        graph: nx.Graph,
+        repetitions: int,
+        iterations: int,
+        infection_prob: float,
+        infections_centers: int,
+        max_infected_nodes: int = -1,
+        rng: random.Random = None,
+) -> (List[Set[int]], List[List[int]]):
+    """Runs repetitions independent SI cascades on graph at once, see _run_batch_model"""
+    return _run_batch_model(graph, repetitions, iterations, infection_prob, 0.0, infections_centers,
+                            max_infected_nodes, True, rng)
+
+
+def batch_sir(
+        graph: nx.Graph,
+        repetitions: int,
+        iterations: int,
+        infection_prob: float,
+        removal_prob: float,
+        infections_centers: int,
+        max_infected_nodes: int = -1,
+        recovered_are_infected=True,
+        rng: random.Random = None,
+) -> (List[Set[int]], List[List[int]]):
+    """Runs repetitions independent SIR cascades on graph at once, see _run_batch_model"""
+    return _run_batch_model(graph, repetitions, iterations, infection_prob, removal_prob, infections_centers,
+                            max_infected_nodes, recovered_are_infected, rng)
+
+
+def _run_batch_model(
+        raw_graph,
+        repetitions: int,
+        iterations: int,
+        infection_prob: float,
+        removal_prob: float,
+        infections_centers: int,
+        max_infected_nodes: int,
+        recovered_are_infected: bool,
+        rng: random.Random = None,
+) -> (List[Set[int]], List[List[int]]):
+    """
+        Advances all cascades together with the transitions and the step count of _run_native_model
+        (the first of the iterations only sets the initial infection, as in ndlib).
+        The states are boolean matrices of shape (repetitions, n), the infected neighbors of every node
+        are counted for all cascades at once by a cumulative sum over the csr neighbor arrays.
+        A cascade stops when it cannot change anymore, i.e. without infected nodes or, without removal,
+        without susceptible nodes next to infected ones.
+        Returns the infected node set and the initial infected nodes of each cascade.
+        Random numbers are drawn from a numpy RandomState seeded from rng, or from numpy.random without rng.
+    """
+    np_random = np.random if rng is None else np.random.RandomState(numpy_seed(rng))
+
+    if (iterations < 0 and max_infected_nodes < 0) or (iterations > 0 and max_infected_nodes > 0):
+        raise AttributeError("Either limited iterations or limited infections need to be specified")
+
+    compact = raw_graph if isinstance(raw_graph, CompactGraph) else CompactGraph.from_networkx(raw_graph)
+    n = compact.number_of_nodes()
+    indptr, indices = compact.indptr, compact.indices
+
+    if max_infected_nodes > 0 and max_infected_nodes > n:
+        raise AttributeError("More max_infected_nodes than nodes in Graph")
+
+    infected = np.zeros((repetitions, n), dtype=bool)
+    removed = np.zeros((repetitions, n), dtype=bool)
+    sources = [np_random.choice(n, infections_centers, replace=False) for _ in range(repetitions)]
+    for r, rep_sources in enumerate(sources):
+        infected[r, rep_sources] = True
+
+    def infected_count():
+        return (infected | removed).sum(axis=1) if recovered_are_infected else infected.sum(axis=1)
+
+    running = np.ones(repetitions, dtype=bool)
+    # The first ndlib iteration only returns the initial status
+    step = 1
+    while running.any() and (iterations < 0 or step < iterations):
+        step += 1
+        if max_infected_nodes > 0:
+            running &= infected_count() < max_infected_nodes
+        running &= infected.any(axis=1)
+        rows = np.flatnonzero(running)
+        if len(rows) == 0:
+            break
+
+        # Number of infected neighbors of every node in every running cascade
+        summed = np.zeros((len(rows), len(indices) + 1), dtype=np.int32)
+        np.cumsum(infected[rows][:, indices], axis=1, out=summed[:, 1:])
+        infected_neighbors = summed[:, indptr[1:]] - summed[:, indptr[:-1]]
+
+        susceptible = ~(infected[rows] | removed[rows])
+        if removal_prob == 0:
+            # Cascades that infected their whole component are final
+            stalled = ~(susceptible & (infected_neighbors > 0)).any(axis=1)
+            if stalled.any():
+                running[rows[stalled]] = False
+                rows, susceptible, infected_neighbors = rows[~stalled], susceptible[~stalled], infected_neighbors[~stalled]
+                if len(rows) == 0:
+                    break
+        infection_chance = 1 - (1 - infection_prob) ** infected_neighbors
+        newly_infected = susceptible & (np_random.random_sample(susceptible.shape) < infection_chance)
+        recovered = infected[rows] & (np_random.random_sample(susceptible.shape) < removal_prob)
+
+        if max_infected_nodes > 0:
+            before = infected_count()[rows] - (0 if recovered_are_infected else recovered.sum(axis=1))
+            # Keep a random subset of the new infections where the limit would be exceeded
+            for i in np.flatnonzero(before + newly_infected.sum(axis=1) > max_infected_nodes):
+                candidates = np.flatnonzero(newly_infected[i])
+                kept = np_random.choice(candidates, max(0, max_infected_nodes - before[i]), replace=False)
+                newly_infected[i] = False
+                newly_infected[i, kept] = True
+
+        infected[rows] = (infected[rows] & ~recovered) | newly_infected
+        removed[rows] |= recovered
+
+    infected_nodes = infected | removed if recovered_are_infected else infected
+    infected_sets = [{compact.labels[u] for u in np.flatnonzero(row).tolist()} for row in infected_nodes]
+    return infected_sets, [[compact.labels[u] for u in rep_sources.tolist()] for rep_sources in sources]
+
+
 def _run_model(
         Model,
         raw_graph: nx.Graph,
@@ -183,12 +508,14 @@ def _run_model(
         max_no_change: int,
         fill_infection_count: bool,
         *config: (str, any),
+        rng: random.Random = None,
         **kwargs,
 ) -> (nx.Graph, List[int]):
     """
         Gets a graph, performs simulation of infections spread with given model.
         Returns infection tree and initial infected nodes.
         Graph is modified in-place
+        With rng the model is seeded from it, ndlib otherwise reseeds numpy from the os on every model.
     """
 
     graph = raw_graph.copy()
@@ -205,7 +532,7 @@ def _run_model(
     for key, value in config:
         cfg.add_model_parameter(key, value)
 
-    model = Model(graph)
+    model = Model(graph, seed=numpy_seed(rng))
     model.set_initial_status(cfg)
 
     initial_infected = [node for (node, status) in model.status.items() if status == 1]
@@ -243,7 +570,7 @@ def _run_model(
         node_status = [(node, state in allowed_states) for (node, state) in status_dict]
 
         if fill_infection_count:
-            node_status = _fill_missing_infections(graph, node_status, max_infected_nodes)
+            node_status = _fill_missing_infections(graph, node_status, max_infected_nodes, rng)
 
     for node, status in node_status:
         if not status:
@@ -252,7 +579,7 @@ def _run_model(
     return graph, initial_infected
 
 
-def _fill_missing_infections(g: nx.Graph, node_status, infection_goal: int):
+def _fill_missing_infections(g: nx.Graph, node_status, infection_goal: int, rng: random.Random = None):
     infected_nodes = [node for node, status in node_status if status]
     missing_infections = int(infection_goal - len(infected_nodes))
 
@@ -261,7 +588,7 @@ def _fill_missing_infections(g: nx.Graph, node_status, infection_goal: int):
 
     # All neighbors of infected nodes that are not infected
     infection_neighbors = list(set(very_ugly_flatten([list(g.neighbors(node)) for node in infected_nodes])) - set(infected_nodes))
-    random.shuffle(infection_neighbors)
+    (rng or random).shuffle(infection_neighbors)
     newly_infected = infection_neighbors[0:min(missing_infections, len(infection_neighbors))]
 
     return [(node, True if node in newly_infected else status) for (node, status) in node_status]
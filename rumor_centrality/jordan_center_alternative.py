@@ -1,28 +1,168 @@
 """Calculation of infection centers based on centrality scores"""
 
+import math
+import random
+from multiprocessing import Pool
+
 import networkx
-from networkx.algorithms.distance_measures import center
-from networkx.algorithms.centrality import betweenness_centrality, closeness_centrality
-from typing import List
+import numpy as np
+from networkx.algorithms.centrality import betweenness_centrality, betweenness_centrality_subset
+from typing import List, Dict, Any
+
+from rumor_centrality.compact_graph import CompactGraph
+from rumor_centrality.graph_distances import center, peeling_center
+
+# Maximal number of cells of the (sources, directed edges) matrix of one batched bfs step
+_BFS_BATCH_CELLS = 2 ** 23
+
+
+def centers_by_jordan_center(g: networkx.Graph, exact: bool = True) -> List[int]:
+    """Infection centers by jordan centrality measurement
+
+    exact computes the same center as networkx.center with eccentricity bounds,
+    otherwise the center is approximated by peeling leaves (see graph_distances.peeling_center)."""
+    return center(g) if exact else peeling_center(g)
+
+
+def _top_nodes(scores: Dict[Any, float], rel_tol: float = 0.0) -> List[Any]:
+    top_score = max(scores.values())
+    return [node for node, score in scores.items() if math.isclose(score, top_score, rel_tol=rel_tol)]
+
+
+# Graph of a betweenness worker, set once per process by _init_betweenness_worker
+_worker_graph = None
+
+
+def _init_betweenness_worker(g: networkx.Graph):
+    global _worker_graph
+    _worker_graph = g
+
+
+def _betweenness_worker_chunk(sources) -> Dict[Any, float]:
+    return betweenness_centrality_subset(_worker_graph, sources, list(_worker_graph.nodes))
+
+
+def parallel_betweenness_centrality(g: networkx.Graph, sources: List[Any], threads: int,
+                                    normalized: bool = False) -> Dict[Any, float]:
+    """Betweenness of all nodes counting only shortest paths starting in sources.
+    The graph is shipped once per worker, chunks of sources are processed in parallel and the results summed.
+
+    Scaled like networkx betweenness_centrality: by n / len(sources) if the sources are a sample of the nodes,
+    and normalized by 2 / ((n - 1) (n - 2)) with normalized."""
+    chunk_size = max(1, math.ceil(len(sources) / (threads * 4)))
+    chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+
+    scores = dict.fromkeys(g.nodes, 0.0)
+    with Pool(threads, initializer=_init_betweenness_worker, initargs=(g,)) as p:
+        for partial_scores in p.imap_unordered(_betweenness_worker_chunk, chunks):
+            for node, score in partial_scores.items():
+                scores[node] += score
+
+    n = g.number_of_nodes()
+    scale = n / len(sources) if 0 < len(sources) < n else 1.0
+    if normalized and n > 2:
+        scale *= 2 / ((n - 1) * (n - 2))
+    if scale != 1.0:
+        for node in scores:
+            scores[node] *= scale
+    return scores
+
+
+def betweenness_sources(g: networkx.Graph, pivots: int = None, rng: random.Random = None) -> List[Any]:
+    """All nodes, or pivots random nodes drawn from rng the same way as networkx betweenness_centrality(k, seed)"""
+    if pivots is None or pivots >= g.number_of_nodes():
+        return list(g.nodes)
+    return (rng or random).sample(list(g.nodes), pivots)
+
+
+def centers_by_betweenness_centrality(g: networkx.Graph, pivots: int = None, threads: int = 1,
+                                      rng: random.Random = None) -> List[int]:
+    """Infection centers by betweenness centrality measurement
+
+    With pivots only shortest paths from that many random source nodes (drawn from rng) are counted,
+    less pivots are faster but the top nodes are less reliable.
+    With threads > 1 the sources are split into chunks which are processed by a process pool."""
+    pivots = None if pivots is None or pivots >= g.number_of_nodes() else pivots
+    if threads <= 1:
+        return _top_nodes(betweenness_centrality(g, k=pivots, seed=rng))
+
+    sources = betweenness_sources(g, pivots, rng)
+    # Summation order differs between runs, so ties are only equal up to rounding
+    return _top_nodes(parallel_betweenness_centrality(g, sources, threads), rel_tol=1e-9)
+
+
+def csr_distance_sums(g: CompactGraph, sources: np.ndarray, per_source: bool = False) -> (np.ndarray, np.ndarray):
+    """Sum of bfs distances from the given source indices and number of sources reaching each node index.
+    With per_source the distance sum and the number of reached nodes of each source are returned instead.
+
+    All sources of a batch advance together level by level, the frontier nodes next to each node are counted
+    by a cumulative sum over the csr neighbor arrays like in graph_simulations._run_batch_model."""
+    n = g.number_of_nodes()
+    indptr, indices = g.indptr, g.indices
+    axis = 1 if per_source else 0
+    dist_sums = np.zeros(len(sources) if per_source else n, dtype=np.int64)
+    reached = np.zeros(len(sources) if per_source else n, dtype=np.int64)
+    batch_size = max(1, _BFS_BATCH_CELLS // max(1, len(indices)))
+
+    for start in range(0, len(sources), batch_size):
+        batch = np.asarray(sources[start:start + batch_size])
+        visited = np.zeros((len(batch), n), dtype=bool)
+        visited[np.arange(len(batch)), batch] = True
+        frontier = visited.copy()
+        summed = np.zeros((len(batch), len(indices) + 1), dtype=np.int32)
+        rows = slice(start, start + len(batch)) if per_source else slice(None)
+        reached[rows] += visited.sum(axis=axis)
+
+        level = 0
+        while frontier.any():
+            level += 1
+            np.cumsum(frontier[:, indices], axis=1, out=summed[:, 1:])
+            frontier = (summed[:, indptr[1:]] > summed[:, indptr[:-1]]) & ~visited
+            visited |= frontier
+            frontier_counts = frontier.sum(axis=axis)
+            dist_sums[rows] += level * frontier_counts
+            reached[rows] += frontier_counts
+
+    return dist_sums, reached
+
+
+def _closeness(total: int, reachable: int, n: int) -> float:
+    # Same operations as networkx closeness_centrality, so the floats are equal as well
+    closeness = 0.0
+    if total > 0.0 and n > 1:
+        closeness = (reachable - 1.0) / total
+        closeness *= (reachable - 1.0) / (n - 1)
+    return closeness
+
+
+def csr_closeness_centrality(g, pivots: int = None, rng: random.Random = None) -> Dict[Any, float]:
+    """Closeness centrality of all nodes, equal to networkx closeness_centrality (with wf_improved) if pivots is None.
 
+    With pivots the distance sums are estimated from the bfs of that many random nodes (drawn from rng),
+    scaled by n / pivots.
+    Less pivots are faster but less exact, the estimate is meant for connected graphs
+    and nodes reached by no pivot get a closeness of 0."""
+    compact = g if isinstance(g, CompactGraph) else CompactGraph.from_networkx(g)
+    n = compact.number_of_nodes()
 
-def centers_by_jordan_center(g: networkx.Graph) -> List[int]:
-    """Infection centers by jordan centrality measurement"""
-    return center(g)
+    if pivots is None or pivots >= n:
+        # The graph is undirected, so the distance sums from all sources equal the sums to all targets
+        dist_sums, reached = csr_distance_sums(compact, np.arange(n))
+        return {label: _closeness(total, reachable, n)
+                for label, total, reachable in zip(compact.labels, dist_sums.tolist(), reached.tolist())}
 
+    dist_sums, reached = csr_distance_sums(compact, np.array((rng or random).sample(range(n), pivots)))
+    estimated_sums = dist_sums * (n / pivots)
+    return {label: (n - 1.0) / total if total > 0 else 0.0
+            for label, total in zip(compact.labels, estimated_sums.tolist())}
 
-def centers_by_betweenness_centrality(g: networkx.Graph) -> List[int]:
-    """Infection centers by betweenness centrality measurement"""
-    b_c_dict = betweenness_centrality(g)
-    top_betweenness_centrality = sorted(b_c_dict.items(), key=lambda x: x[1], reverse=True)[0][1]
-    return [node for node, score in b_c_dict.items() if score == top_betweenness_centrality]
 
+def centers_by_distance_centrality(g: networkx.Graph, pivots: int = None, rng: random.Random = None) -> List[int]:
+    """Infection centers by distance centrality measurement
 
-def centers_by_distance_centrality(g: networkx.Graph) -> List[int]:
-    """Infection centers by distance centrality measurement"""
-    d_c_dict = closeness_centrality(g)
-    top_distance_centrality = sorted(d_c_dict.items(), key=lambda x: x[1], reverse=True)[0][1]
-    return [node for node, score in d_c_dict.items() if score == top_distance_centrality]
+    Closeness is computed by batched bfs on a csr copy of g, see csr_closeness_centrality.
+    With pivots it is estimated from that many random nodes (drawn from rng), less pivots are faster but less exact."""
+    return _top_nodes(csr_closeness_centrality(g, pivots, rng))
 
 
 def test():
@@ -30,10 +170,13 @@ def test():
 
     print("centers_by_jordan_center")
     print(centers_by_jordan_center(g))
+    print(centers_by_jordan_center(g, exact=False))
     print("centers_by_betweenness_centrality")
     print(centers_by_betweenness_centrality(g))
+    print(centers_by_betweenness_centrality(g, pivots=10, threads=2))
     print("centers_by_distance_centrality")
     print(centers_by_distance_centrality(g))
+    print(centers_by_distance_centrality(g, pivots=10))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+"""Pipeline stages of the missing nodes experiment (missing_experiment.py)
+
+An infection is simulated on a reference graph, a percentage of the infected nodes is removed and their
+neighbors reconnected, the sources are predicted on the reduced graph and compared to the real ones.
+The reference graph is given by a graph callback, e.g. partial(experiment_scheduler.worker_graph, name) in a
+sweep, and every sample can be regenerated from its seed with simulate_and_remove."""
+import random
+from functools import partial
+from statistics import median
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import networkx as nx
+
+import rumor_centrality.jordan_center_alternative as jo
+import rumor_centrality.rumor_detection as raw
+from rumor_centrality import graph_simulations
+from rumor_centrality.evaluation import SourceDistances
+from rumor_centrality.graph_perturbation import remove_nodes_and_reconnect
+from rumor_centrality.pipeline import perturbed_sample
+
+# Version of the result of a sample, part of the task parameters so that a changed result schema
+# never reuses stored records. 2: results with median_hop_distance, failed samples as None
+RESULT_VERSION = 2
+
+
+def simulate_si(g: nx.Graph, infected_nodes_percent: float, rng: random.Random):
+    return graph_simulations.si(g, -1, 0.3, 1, int(len(g.nodes) * infected_nodes_percent), 10, True, rng=rng)
+
+
+def simulate_sis(g: nx.Graph, infected_nodes_percent: float, rng: random.Random):
+    return graph_simulations.sis(g, -1, 0.3, 0.1, 1, int(len(g.nodes) * infected_nodes_percent), 10, True, rng=rng)
+
+
+def simulate_sir(g: nx.Graph, infected_nodes_percent: float, rng: random.Random):
+    return graph_simulations.sir(g, -1, 0.3, 0.1, 1, int(len(g.nodes) * infected_nodes_percent), 10, True, rng=rng)
+
+
+SIMULATIONS = {
+    "si": simulate_si,
+    "sis": simulate_sis,
+    "sir": simulate_sir,
+}
+
+
+def rumor_centrality_prediction(g: nx.Graph) -> List[int]:
+    return raw.get_center_prediction(raw.networkx_graph_to_adj_list(g), use_fact=False)
+
+
+METRICS = {
+    "rumor_centrality": rumor_centrality_prediction,
+    "jordan_centrality": jo.centers_by_jordan_center,
+    "betweenness_centrality": jo.centers_by_betweenness_centrality,
+    "distance_centrality": jo.centers_by_distance_centrality,
+}
+
+
+def get_experiment_graph(g: nx.Graph, percent_missing: float, rng: random.Random = None):
+    return remove_nodes_and_reconnect(g, percent_missing, rng)
+
+
+# BFS distances in the reference graph from the real sources, shared by all metrics and samples of a process
+_source_distances: Optional[SourceDistances] = None
+
+
+def source_distances(reference: nx.Graph) -> SourceDistances:
+    global _source_distances
+    if _source_distances is None or _source_distances.g is not reference:
+        _source_distances = SourceDistances(reference)
+    return _source_distances
+
+
+def get_best_hop_distance(distances: SourceDistances, original_centers, predicted_centers):
+    best_pair = None
+    best_distance = len(distances.g.nodes)
+    for o_c in original_centers:
+        for p_c in predicted_centers:
+            d = distances.path_length(o_c, p_c)
+            if d < best_distance:
+                best_distance = d
+                best_pair = (o_c, p_c)
+    return best_pair, best_distance
+
+
+def get_all_hop_distances(distances: SourceDistances, original_centers, predicted_centers) -> List[int]:
+    return [distances.path_length(o_c, p_c) for o_c in original_centers for p_c in predicted_centers]
+
+
+def get_median_hop_distance(distances: SourceDistances, original_centers, predicted_centers) -> float:
+    return median(get_all_hop_distances(distances, original_centers, predicted_centers))
+
+
+# Stages, see pipeline.run_sample. Failed samples (empty or disconnected graph) stop with None
+def simulate_sample(graph_callback: Callable[[], nx.Graph], simulation: str, infected_nodes_percent: float,
+                    rng: random.Random) -> Optional[Tuple[nx.Graph, List[int]]]:
+    infected_graph, centers = SIMULATIONS[simulation](graph_callback(), infected_nodes_percent, rng)
+    return None if nx.is_empty(infected_graph) else (infected_graph, centers)
+
+
+def remove_sample_nodes(simulated: Tuple[nx.Graph, List[int]], rng: random.Random,
+                        p_r: float) -> Optional[nx.Graph]:
+    ex_graph, _ = get_experiment_graph(simulated[0], p_r, rng)
+    if nx.is_empty(ex_graph) or not nx.is_connected(ex_graph):
+        return None
+    return ex_graph
+
+
+def predict_sample(ex_graph: nx.Graph) -> Dict[str, List[int]]:
+    return {metric_name: metric_callback(ex_graph) for metric_name, metric_callback in METRICS.items()}
+
+
+def evaluate_sample(graph_callback: Callable[[], nx.Graph], simulated: Tuple[nx.Graph, List[int]],
+                    ex_graph: nx.Graph, predicted_centers: Dict[str, List[int]]) -> Dict[str, Any]:
+    _, real_centers = simulated
+    distances = source_distances(graph_callback())
+    return {
+        "real_centers": real_centers,
+        "predicted_centers": predicted_centers,
+        "median_hop_distance": {
+            metric_name: get_median_hop_distance(distances, real_centers, metric_centers)
+            for metric_name, metric_centers in predicted_centers.items()
+        },
+    }
+
+
+def sample_stages(graph_callback: Callable[[], nx.Graph], simulation: str, infected_nodes_percent: float,
+                  p_r: float) -> Tuple[Callable, Callable, Callable, Callable]:
+    """(simulate, perturb, predict, evaluate) of pipeline.run_sample for one configuration"""
+    return (partial(simulate_sample, graph_callback, simulation, infected_nodes_percent),
+            partial(remove_sample_nodes, p_r=p_r),
+            predict_sample,
+            partial(evaluate_sample, graph_callback))
+
+
+def simulate_and_remove(graph_callback: Callable[[], nx.Graph], simulation: str, infected_nodes_percent: float,
+                        p_r: float, seed: int) -> Tuple[Optional[Tuple[nx.Graph, List[int]]], Optional[nx.Graph]]:
+    """((infection graph, real centers), reduced graph) of a sample, None where it failed.
+    Everything is drawn from the seed, so samples are not stored but regenerated from the seed of their record."""
+    simulate, perturb, _, _ = sample_stages(graph_callback, simulation, infected_nodes_percent, p_r)
+    return perturbed_sample(seed, simulate, perturb)
@@ -0,0 +1,89 @@
+"""Streaming sample pipeline: simulate -> perturb -> predict -> evaluate
+
+Every sample runs through all stages inside one worker and only its evaluated result is sent back. Results are
+yielded in order of completion (see sweep.stream_sweep) and folded into running summaries, so the main process
+never holds more samples than are in flight."""
+import math
+import random
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from rumor_centrality.seeding import derive_seed
+
+
+def perturbed_sample(seed: int, simulate: Callable, perturb: Callable) -> Tuple[Any, Any]:
+    """(simulated, perturbed) of the sample with seed, both stages draw from one random stream.
+
+    simulate(rng) and perturb(simulated, rng) return None if the sample failed, e.g. an empty or disconnected graph,
+    later stages are then skipped and None is returned in their place. Regenerates a stored sample from its seed."""
+    rng = random.Random(seed)
+    simulated = simulate(rng)
+    if simulated is None:
+        return None, None
+    return simulated, perturb(simulated, rng)
+
+
+def run_sample(seed: int, simulate: Callable, perturb: Callable, predict: Callable, evaluate: Callable) -> Any:
+    """evaluate(simulated, perturbed, predict(perturbed)) of the sample with seed, or None if a stage failed"""
+    simulated, perturbed = perturbed_sample(seed, simulate, perturb)
+    if perturbed is None:
+        return None
+    predictions = predict(perturbed)
+    if predictions is None:
+        return None
+    return evaluate(simulated, perturbed, predictions)
+
+
+def sample_task(params: Dict[str, Any], simulate: Callable, perturb: Callable, predict: Callable,
+                evaluate: Callable) -> Tuple[Dict[str, Any], Callable, tuple]:
+    """Sweep task running the pipeline on the sample seeded by derive_seed(params).
+    The stages have to be picklable, e.g. module level functions or partials of them."""
+    return params, run_sample, (derive_seed(params), simulate, perturb, predict, evaluate)
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a series of values, updated one value at a time (Welford)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._squared_deviations = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._squared_deviations += delta * (value - self.mean)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance, nan for less than two values"""
+        return self._squared_deviations / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "mean": self.mean if self.count else math.nan, "std": self.std,
+                "min": self.minimum, "max": self.maximum}
+
+
+class StreamingSummary:
+    """Frequencies and running statistics of a series of values. None (a failed sample) is counted
+    as missing in the frequencies and left out of the statistics."""
+
+    def __init__(self, missing: Any = -1):
+        self.missing = missing
+        self.frequencies: Dict[Any, int] = {}
+        self.stats = RunningStats()
+
+    def add(self, value: Optional[float]) -> None:
+        if value is None:
+            self.frequencies[self.missing] = self.frequencies.get(self.missing, 0) + 1
+            return
+        self.frequencies[value] = self.frequencies.get(value, 0) + 1
+        self.stats.add(value)
@@ -0,0 +1,143 @@
+"""Append-only storage of experiment results, one JSON record per line
+
+Every record is written and synced as soon as it is appended, so a crash loses at most the record being written.
+Reference graphs are stored as .npz node and edge arrays, samples are not stored but regenerated from their seed."""
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Union
+
+import networkx as nx
+import numpy as np
+
+
+def _graph_arrays(g: nx.Graph) -> (np.ndarray, np.ndarray):
+    nodes = np.fromiter(g.nodes, dtype=np.int64, count=g.number_of_nodes())
+    edges = np.array(list(g.edges), dtype=np.int64).reshape(-1, 2)
+    return nodes, edges
+
+
+def _graph_from_arrays(nodes: np.ndarray, edges: np.ndarray) -> nx.Graph:
+    g = nx.Graph()
+    g.add_nodes_from(nodes.tolist())
+    g.add_edges_from(edges.tolist())
+    return g
+
+
+def save_graph(path: Union[str, Path], g: nx.Graph) -> None:
+    """Stores the node and edge arrays of an integer labeled graph as .npz"""
+    nodes, edges = _graph_arrays(g)
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp.npz")
+    np.savez(tmp_path, nodes=nodes, edges=edges)
+    os.replace(tmp_path, path)
+
+
+def load_graph(path: Union[str, Path]) -> nx.Graph:
+    with np.load(path) as stored:
+        return _graph_from_arrays(stored["nodes"], stored["edges"])
+
+
+def canonical_json(value) -> str:
+    """JSON with sorted keys and without whitespace, equal for equal values"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=_json_default)
+
+
+def _json_default(value):
+    # Numpy scalars and arrays, e.g. node labels of a CompactGraph or a simulation
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResultStore:
+    """Line delimited JSON file of result records, which can be appended to from one process at a time.
+
+    Reading is lazy and skips an incomplete last line left by a crash, opening for appending cuts it off.
+    Use the store as context manager to keep the file open while appending."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = None
+
+    def __enter__(self) -> "ResultStore":
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self) -> None:
+        if self._file is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._truncate_incomplete_line()
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _truncate_incomplete_line(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open("rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            # Search backwards for the last newline, everything after it is a partially written record
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    if start + newline + 1 < end:
+                        f.truncate(start + newline + 1)
+                    return
+                position = start
+            f.truncate(0)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Writes the record and syncs it to disk"""
+        line = json.dumps(record, default=_json_default)
+        if self._file is None:
+            with self:
+                self._write_line(line)
+        else:
+            self._write_line(line)
+
+    def _write_line(self, line: str) -> None:
+        self._file.write(line + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Incomplete last record of an interrupted run
+                    return
+                if line.strip():
+                    yield json.loads(line)
+
+    def read(self, where: Callable[[Dict[str, Any]], bool] = None, limit: Optional[int] = None) \
+            -> List[Dict[str, Any]]:
+        """The first limit records (all if None) for which where is true"""
+        records = []
+        for record in self:
+            if limit is not None and len(records) >= limit:
+                break
+            if where is None or where(record):
+                records.append(record)
+        return records
+
+    def completed(self, *fields: str) -> Set[Any]:
+        """Values of fields (tuples if several) of all stored records, to skip them when resuming"""
+        if len(fields) == 1:
+            return {record.get(fields[0]) for record in self}
+        return {tuple(record.get(field) for field in fields) for record in self}
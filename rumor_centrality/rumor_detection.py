@@ -7,6 +7,8 @@ from collections import deque
 from multiprocessing import Pool, Manager
 from decimal import Decimal
 
+from rumor_centrality.compact_graph import CompactGraph
+
 
 def networkx_graph_to_adj_list(g: networkx.Graph) -> Dict[int, List[int]]:
     """Transforms a networkx graph to an adj list dict node -> node list"""
@@ -17,9 +19,9 @@ def networkx_graph_to_adj_list(g: networkx.Graph) -> Dict[int, List[int]]:
     # The back-edge 1->0 is missing. Therefore we need to add those manually
     adj_list = {}
     for source, neighbors in g.adjacency():
-        adj_list[source] = adj_list.get(source, set()).union(set(neighbors))
+        adj_list.setdefault(source, set()).update(neighbors)
         for target in neighbors:
-            adj_list[target] = adj_list.get(target, set()).union({source})
+            adj_list.setdefault(target, set()).add(source)
 
     return adj_list
 
@@ -53,87 +55,186 @@ def get_bfs_tree(adj_list, root) -> Dict[int, List[int]]:
     return T
 
 
-def rumor_centrality(adj_list, root, use_fact=False):
-    """Calculates the rumor centrality for root on the graph given by adj_list"""
-    t = {}
-    p = {}
-    r = {}
-    visited = {}
+def _root_score(n, t_root, p_root, use_fact=False, use_log=False):
+    """Rumor centrality of the root of a bfs tree with n nodes, given its subtree size and product.
+    In log space p_root is the sum of the logs of all subtree sizes."""
+    if use_log:
+        log_score = math.log(t_root) - p_root
+        return math.lgamma(n) + log_score if use_fact else log_score
+    if use_fact:
+        return Decimal(math.factorial(n - 1)) / (Decimal(p_root) / Decimal(t_root))
+    return t_root / p_root
 
-    bfs_tree_adj_list = get_bfs_tree(adj_list, root)
 
-    n = len(bfs_tree_adj_list)
+def get_bfs_order(adj_list, root) -> Tuple[List[int], List[int]]:
+    """Returns the nodes reachable from root in bfs order and for each of them the position
+    of its parent in that order (-1 for root). The implicit tree is the same as in get_bfs_tree."""
+    order = [root]
+    parents = [-1]
+    position = {root: 0}
 
-    def dfs_up(v):
-        children = bfs_tree_adj_list[v]
-        visited[v] = True
+    i = 0
+    while i < len(order):
+        for child in adj_list[order[i]]:
+            if child not in position:
+                position[child] = len(order)
+                order.append(child)
+                parents.append(i)
+        i += 1
 
-        if len(children) == 0:
-            t[v] = 1
-            p[v] = 1
+    return order, parents
 
-        current_t = 1
-        current_p = 1
-        for child in children:
-            if not visited.get(child, False):
-                dfs_up(child)
 
-            current_t += t[child]
-            current_p *= p[child]
+def _subtree_sweep(parents: List[int], use_log=False) -> Tuple[List[int], List]:
+    """Computes subtree sizes t and products p of a bfs tree in one reverse sweep over the bfs order.
+    In log space p holds the sums of the logs instead."""
+    n = len(parents)
+    t = [1] * n
+    p = [0.0] * n if use_log else [1] * n
 
-        t[v] = current_t
-        p[v] = current_t * current_p
+    # Every child comes after its parent, so a node is complete once the sweep reaches it
+    for i in range(n - 1, -1, -1):
+        if use_log:
+            p[i] += math.log(t[i])
+        else:
+            p[i] *= t[i]
 
-    def dfs_down(v):
-        children = bfs_tree_adj_list[v]
-        visited[v] = True
+        parent = parents[i]
+        if parent >= 0:
+            t[parent] += t[i]
+            if use_log:
+                p[parent] += p[i]
+            else:
+                p[parent] *= p[i]
 
-        for child in children:
-            if not visited.get(child, False):
-                r[child] = r[v] * t[child] / (n - t[child])
-                dfs_down(child)
+    return t, p
 
-    dfs_up(root)
 
-    if use_fact:
-        r[root] = Decimal(math.factorial(n - 1)) / (Decimal(p[root]) / Decimal(t[root]))
-    else:
-        r[root] = t[root] / p[root]
-    for vis in visited:
-        visited[vis] = False
+def rumor_centrality(adj_list, root, use_fact=False, use_log=False):
+    """Calculates the rumor centrality for root on the graph given by adj_list
+
+    With use_log the logarithm of the score is returned. The subtree sizes are then summed as
+    floats in log space instead of being multiplied into big integers."""
+    _, parents = get_bfs_order(adj_list, root)
+    t, p = _subtree_sweep(parents, use_log)
+
+    return _root_score(len(parents), t[0], p[0], use_fact, use_log)
+
+
+def rumor_centrality_all(adj_list, root, use_fact=False, use_log=False) -> Dict[int, float]:
+    """Calculates the rumor centrality of all nodes reachable from root with a single bfs tree.
+
+    One upward sweep computes the subtree sizes t and products p of the bfs tree of root,
+    one downward sweep then propagates r[child] = r[v] * t[child] / (n - t[child]).
+    On trees this is exact, on general graphs every node is scored on the bfs tree of root
+    instead of its own bfs tree."""
+    order, parents = get_bfs_order(adj_list, root)
+    t, p = _subtree_sweep(parents, use_log)
+    n = len(order)
+
+    r = [None] * n
+    r[0] = _root_score(n, t[0], p[0], use_fact, use_log)
+    for i in range(1, n):
+        if use_log:
+            r[i] = r[parents[i]] + math.log(t[i]) - math.log(n - t[i])
+        else:
+            r[i] = r[parents[i]] * t[i] / (n - t[i])
+
+    return dict(zip(order, r))
+
+
+def parallel_multiprocessing_wrapper(adj_list, root, use_fact, use_log=False):
+    return root, rumor_centrality(adj_list, root, use_fact, use_log)
 
-    # We do not use the results of this calculation
-    # It is described in the paper, but I dont see its use?
-    dfs_down(root)
 
-    return r[root]
+# Read-only adjacency of a csr worker, set once per process by _init_csr_worker
+_worker_adj_list = None
+_worker_options = None
 
 
-def parallel_multiprocessing_wrapper(adj_list, root, use_fact):
-    return root, rumor_centrality(adj_list, root, use_fact)
+def _init_csr_worker(indptr, indices, use_fact, use_log):
+    global _worker_adj_list, _worker_options
+    neighbors = indices.tolist()
+    bounds = indptr.tolist()
+    _worker_adj_list = [neighbors[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+    _worker_options = (use_fact, use_log)
 
 
-def get_rumor_centrality_lookup(adj_list, use_fact=False, threads=1) -> Dict[int, float]:
-    """Returns each node of the adj list with its respective rumor centrality in a dict"""
+def _csr_worker_chunk(roots) -> List[Tuple[int, float]]:
+    use_fact, use_log = _worker_options
+    return [(root, rumor_centrality(_worker_adj_list, root, use_fact, use_log)) for root in roots]
+
+
+def _csr_parallel_lookup(g: CompactGraph, use_fact, use_log, threads) -> Dict[int, float]:
+    """Ships the graph once per worker as csr arrays and scores chunks of roots in each task"""
+    nodes, indptr, indices = g.labels, g.indptr, g.indices
+    chunk_size = max(1, math.ceil(len(nodes) / (threads * 4)))
+    chunks = [range(start, min(start + chunk_size, len(nodes))) for start in range(0, len(nodes), chunk_size)]
+
+    rumor_centrality_lookup = {}
+    with Pool(threads, initializer=_init_csr_worker, initargs=(indptr, indices, use_fact, use_log)) as p:
+        for batch in p.imap_unordered(_csr_worker_chunk, chunks):
+            rumor_centrality_lookup.update((nodes[root], score) for root, score in batch)
+
+    return {node: rumor_centrality_lookup[node] for node in nodes}
+
+
+def get_rumor_centrality_lookup(adj_list, use_fact=False, threads=1, message_passing=False,
+                                use_log=False, parallel_backend="csr") -> Dict[int, float]:
+    """Returns each node of the adj list with its respective rumor centrality in a dict
+
+    With message_passing all nodes of a connected component are scored on one bfs tree in O(n),
+    see rumor_centrality_all. threads is ignored in this mode.
+    With use_log the logarithms of the scores are returned, which keep the same ranking.
+    With threads > 1 the parallel_backend "csr" copies the graph once into every worker,
+    "manager" shares it through a multiprocessing manager proxy instead.
+    adj_list can also be a CompactGraph, which is then traversed by node indices."""
     if threads < 1:
         raise ValueError("At least one thread is needed to run!")
 
-    if threads > 1:
+    if threads > 1 and parallel_backend == "csr" and not message_passing:
+        if not isinstance(adj_list, CompactGraph):
+            adj_list = CompactGraph.from_adj_list(adj_list)
+        return _csr_parallel_lookup(adj_list, use_fact, use_log, threads)
+
+    if isinstance(adj_list, CompactGraph):
+        index_lookup = get_rumor_centrality_lookup(
+            dict(enumerate(adj_list.adjacency_lists())), use_fact, threads, message_passing, use_log, parallel_backend)
+        return {adj_list.labels[i]: score for i, score in index_lookup.items()}
+
+    if message_passing:
+        rumor_centrality_lookup = {}
+        for v in adj_list.keys():
+            if v not in rumor_centrality_lookup:
+                rumor_centrality_lookup.update(rumor_centrality_all(adj_list, v, use_fact, use_log))
+
+        return {v: rumor_centrality_lookup[v] for v in adj_list.keys()}
+
+    if threads > 1 and parallel_backend == "manager":
         m = Manager()
         adj_proxy = m.dict(adj_list)
-        args = [(adj_proxy, v, use_fact) for v in adj_list.keys()]
+        args = [(adj_proxy, v, use_fact, use_log) for v in adj_list.keys()]
         with Pool(threads) as p:
             rumor_centrality_lookup = p.starmap(parallel_multiprocessing_wrapper, args)
 
         return dict(rumor_centrality_lookup)
 
-    return dict(map(lambda v: (v, rumor_centrality(adj_list, v, use_fact)), list(adj_list.keys())))
+    if threads > 1:
+        raise ValueError(f"Unknown parallel backend {parallel_backend}")
+
+    return dict(map(lambda v: (v, rumor_centrality(adj_list, v, use_fact, use_log)), list(adj_list.keys())))
+
 
+def get_center_prediction(adj_list, use_fact=False, threads=1, message_passing=False, use_log=False,
+                          tolerance=1e-9):
+    """Returns the nodes with the maximum rumor centrality of all nodes
 
-def get_center_prediction(adj_list, use_fact=False, threads=1):
-    """Returns the nodes with the maximum rumor centrality of all nodes"""
-    lookup = get_rumor_centrality_lookup(adj_list, use_fact, threads)
+    With use_log all nodes whose log score is within tolerance of the maximum are returned,
+    as floating point sums of logs are not exact."""
+    lookup = get_rumor_centrality_lookup(adj_list, use_fact, threads, message_passing, use_log)
     max_rumor_centrality = max(lookup.values())
+    if use_log:
+        return [node for node, score in lookup.items() if score >= max_rumor_centrality - tolerance]
     return [node for node, score in lookup.items() if score == max_rumor_centrality]
 
 
@@ -166,6 +267,8 @@ def test():
     adj_list = networkx_graph_to_adj_list(g)
     get_rumor_centrality_lookup(adj_list)
     get_rumor_centrality_lookup(adj_list, True)
+    get_rumor_centrality_lookup(adj_list, message_passing=True)
+    get_rumor_centrality_lookup(adj_list, use_log=True)
 
 
 if __name__ == "__main__":
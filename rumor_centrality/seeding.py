@@ -0,0 +1,46 @@
+"""Reproducible random streams for experiments
+
+Every task gets its own random.Random, seeded by a hash of a root seed and the task parameters. Streams of
+different tasks are independent of each other, of the process running them and of the order of execution.
+Functions of this package accept such an rng, ndlib models and networkx generators are seeded from it."""
+import hashlib
+import random
+from contextlib import contextmanager
+from typing import Any, Optional
+
+import numpy as np
+
+from rumor_centrality.result_store import canonical_json
+
+
+def derive_seed(*key: Any) -> int:
+    """64 bit seed from the sha256 of the canonical JSON of key, e.g. derive_seed(root_seed, task_params)"""
+    return int.from_bytes(hashlib.sha256(canonical_json(list(key)).encode()).digest()[:8], "big")
+
+
+def task_rng(*key: Any) -> random.Random:
+    """Independent random stream of the task identified by key, see derive_seed"""
+    return random.Random(derive_seed(*key))
+
+
+def numpy_seed(rng: Optional[random.Random]) -> Optional[int]:
+    """Seed for numpy (and ndlib, which seeds numpy's global state) drawn from rng, None without rng"""
+    return None if rng is None else rng.getrandbits(32)
+
+
+@contextmanager
+def seeded_globals(rng: Optional[random.Random]):
+    """Seeds the global random and numpy.random state from rng within the block and restores them afterwards.
+    For code without a seed parameter, e.g. graph_callbacks calling networkx generators. Does nothing without rng."""
+    if rng is None:
+        yield
+        return
+
+    random_state, numpy_state = random.getstate(), np.random.get_state()
+    random.seed(rng.getrandbits(64))
+    np.random.seed(numpy_seed(rng))
+    try:
+        yield
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(numpy_state)
@@ -0,0 +1,102 @@
+"""Ranked lists of the most likely infection sources for all prediction metrics"""
+import heapq
+import random
+from typing import List, Tuple, Any
+
+import networkx as nx
+import numpy as np
+from networkx.algorithms.centrality import betweenness_centrality
+
+from rumor_centrality.compact_graph import CompactGraph
+from rumor_centrality.graph_distances import bfs, center, smallest_eccentricities
+from rumor_centrality.jordan_center_alternative import parallel_betweenness_centrality, csr_closeness_centrality, \
+    csr_distance_sums, _closeness, betweenness_sources
+from rumor_centrality.rumor_detection import rumor_centrality, networkx_graph_to_adj_list
+
+METRICS = ["rumor_centrality", "jordan_centrality", "betweenness_centrality", "distance_centrality"]
+
+
+def _top_k(scores, k: int, position, largest: bool = True) -> List[Tuple[Any, float]]:
+    """Best k (node, score) pairs, ties are ranked in node order"""
+    if largest:
+        return heapq.nsmallest(k, scores, key=lambda item: (-item[1], position[item[0]]))
+    return heapq.nsmallest(k, scores, key=lambda item: (item[1], position[item[0]]))
+
+
+def _rumor_candidates(g: nx.Graph, candidate_radius: int) -> List[Any]:
+    """Nodes within candidate_radius hops of the jordan center"""
+    candidates = set()
+    for jordan_center in center(g):
+        dists, _ = bfs(g, jordan_center)
+        candidates.update(node for node, dist in dists.items() if dist <= candidate_radius)
+    return [node for node in g if node in candidates]
+
+
+def top_k_rumor_centrality(g: nx.Graph, k: int, candidate_radius: int = None) -> List[Tuple[Any, float]]:
+    """The k nodes of highest log rumor centrality. With candidate_radius only nodes
+    that close to the jordan center are scored, which is faster but can miss the rumor center."""
+    position = {node: i for i, node in enumerate(g)}
+    # The bfs trees depend on the neighbor order, so score on the same adj list as get_center_prediction
+    adj_list = networkx_graph_to_adj_list(g)
+    candidates = list(g) if candidate_radius is None else _rumor_candidates(g, candidate_radius)
+    scores = ((node, rumor_centrality(adj_list, node, use_log=True)) for node in candidates)
+    return _top_k(scores, k, position)
+
+
+def top_k_jordan_centrality(g: nx.Graph, k: int) -> List[Tuple[Any, float]]:
+    """The k nodes of smallest eccentricity, the bfs stop as soon as the eccentricity bounds settle them"""
+    return smallest_eccentricities(g, k)
+
+
+def top_k_betweenness_centrality(g: nx.Graph, k: int, pivots: int = None, threads: int = 1,
+                                 rng: random.Random = None) -> List[Tuple[Any, float]]:
+    """The k nodes of highest betweenness, pivots, threads and rng as in centers_by_betweenness_centrality.
+    Scores are normalized as by networkx for any number of threads."""
+    position = {node: i for i, node in enumerate(g)}
+    pivots = None if pivots is None or pivots >= g.number_of_nodes() else pivots
+    if threads <= 1:
+        scores = betweenness_centrality(g, k=pivots, seed=rng)
+    else:
+        scores = parallel_betweenness_centrality(g, betweenness_sources(g, pivots, rng), threads, normalized=True)
+    return _top_k(scores.items(), k, position)
+
+
+def top_k_distance_centrality(g: nx.Graph, k: int, pivots: int = None, refine: int = None,
+                              rng: random.Random = None) \
+        -> List[Tuple[Any, float]]:
+    """The k nodes of highest closeness.
+
+    With pivots the closeness is first estimated from that many random nodes (drawn from rng), then the exact closeness
+    of the k + refine best estimates (refine defaults to k) is computed to rank them."""
+    compact = g if isinstance(g, CompactGraph) else CompactGraph.from_networkx(g)
+    position = {node: i for i, node in enumerate(compact.labels)}
+    estimates = csr_closeness_centrality(compact, pivots, rng)
+    if pivots is None or pivots >= compact.number_of_nodes():
+        return _top_k(estimates.items(), k, position)
+
+    refine = k if refine is None else refine
+    candidates = [node for node, _ in _top_k(estimates.items(), k + refine, position)]
+    sources = np.array([compact.index[node] for node in candidates])
+    dist_sums, reached = csr_distance_sums(compact, sources, per_source=True)
+    n = compact.number_of_nodes()
+    scores = [(node, _closeness(total, reachable, n))
+              for node, total, reachable in zip(candidates, dist_sums.tolist(), reached.tolist())]
+    return _top_k(scores, k, position)
+
+
+def top_k_sources(g: nx.Graph, k: int = 10, metric: str = "rumor_centrality", **options) -> List[Tuple[Any, float]]:
+    """Ranked list of the k most likely infection sources of g as (node, score) pairs.
+
+    The scores are the log rumor centrality, the eccentricity (ranked ascending), the betweenness
+    and the closeness centrality. Options are passed on to the top_k_<metric> function."""
+    if k <= 0:
+        return []
+    if metric == "rumor_centrality":
+        return top_k_rumor_centrality(g, k, **options)
+    if metric == "jordan_centrality":
+        return top_k_jordan_centrality(g, k, **options)
+    if metric == "betweenness_centrality":
+        return top_k_betweenness_centrality(g, k, **options)
+    if metric == "distance_centrality":
+        return top_k_distance_centrality(g, k, **options)
+    raise ValueError(f"Unknown metric {metric}, expected one of {METRICS}")
@@ -0,0 +1,58 @@
+"""Resumable parameter sweeps with content addressed task keys
+
+Every task is identified by the sha256 of its canonical JSON parameters, e.g. graph, dynamic, infection size,
+metric and seed. Finished tasks are appended to a ResultStore, tasks whose key is already stored are skipped,
+so an interrupted sweep continues where it stopped and changed parameters never reuse old results."""
+import hashlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from rumor_centrality.experiment_scheduler import run_tasks
+from rumor_centrality.result_store import ResultStore, canonical_json
+
+
+def task_key(params: Dict[str, Any]) -> str:
+    """Deterministic key of the task parameters, independent of the order of the dict"""
+    return hashlib.sha256(canonical_json(params).encode()).hexdigest()
+
+
+def pending_tasks(store: ResultStore, tasks: List[Tuple[Dict[str, Any], Callable, tuple]]) \
+        -> List[Tuple[str, Dict[str, Any], Callable, tuple]]:
+    """(key, params, function, args) of all tasks that are not stored yet, duplicated tasks only once"""
+    done_keys = store.completed("key")
+    pending = {}
+    for params, function, args in tasks:
+        key = task_key(params)
+        if key not in done_keys and key not in pending:
+            pending[key] = (key, params, function, args)
+    return list(pending.values())
+
+
+def run_sweep(store: ResultStore, pending: List[Tuple[str, Dict[str, Any], Callable, tuple]],
+              graph_callbacks: Dict[str, Callable[[], Any]] = None, processes: int = 10,
+              timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Runs the pending tasks of pending_tasks with experiment_scheduler.run_tasks.
+
+    Each finished task is appended as one record {"key": task_key(params), "params": params, "result": result},
+    a single synced line, so a task is either stored completely or not at all. Timed out tasks are stored
+    with result None and not repeated. Yields the stored records in order of completion."""
+    with store:
+        for index, result in run_tasks([(function, args) for _, _, function, args in pending],
+                                       graph_callbacks, processes, timeout):
+            key, params, _, _ = pending[index]
+            record = {"key": key, "params": params, "result": result}
+            store.append(record)
+            yield record
+
+
+def stream_sweep(store: ResultStore, tasks: List[Tuple[Dict[str, Any], Callable, tuple]],
+                 graph_callbacks: Dict[str, Callable[[], Any]] = None, processes: int = 10,
+                 timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Records of all tasks: first the ones already stored, read lazily, then the pending ones as they finish.
+    Consumers can fold them into summaries one by one instead of collecting all results."""
+    task_keys = {task_key(params) for params, _, _ in tasks}
+    pending = pending_tasks(store, tasks)
+    for record in store:
+        if record["key"] in task_keys:
+            task_keys.discard(record["key"])
+            yield record
+    yield from run_sweep(store, pending, graph_callbacks, processes, timeout)
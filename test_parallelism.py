@@ -18,16 +18,18 @@ def main():
     seq_r = get_rumor_centrality_lookup(adj_list, USE_FACT, threads=1)
     seq_time = time.time() - start
 
-    start = time.time()
-    par_r = get_rumor_centrality_lookup(adj_list, USE_FACT, threads=thread_count)
-    par_time = time.time() - start
-
-    if all(map(lambda e: e[0] == e[1], zip(seq_r.items(), par_r.items()))):
-        print("Results are the same!")
-    else:
-        print("Results differ!")
     print(f"Sequential Runtime: {seq_time} seconds")
-    print(f"Parallel Runtime ({thread_count} threads): {par_time} seconds")
+
+    for backend in ["csr", "manager"]:
+        start = time.time()
+        par_r = get_rumor_centrality_lookup(adj_list, USE_FACT, threads=thread_count, parallel_backend=backend)
+        par_time = time.time() - start
+
+        if all(map(lambda e: e[0] == e[1], zip(seq_r.items(), par_r.items()))):
+            print("Results are the same!")
+        else:
+            print("Results differ!")
+        print(f"Parallel Runtime ({thread_count} threads, {backend} backend): {par_time} seconds")
 
 
 if __name__ == "__main__":
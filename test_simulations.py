@@ -0,0 +1,47 @@
+import sys
+import time
+
+import numpy as np
+
+from rumor_centrality import graph_simulations
+from rumor_centrality.graph_generator import synthetic_internet
+
+# Standard errors the mean cascade sizes may differ by to be accepted as the same model,
+# cascades on scale free graphs are heavy tailed, so use some hundred repetitions
+TOLERANCE = 3
+
+
+def standard_error(sizes):
+    return np.std(sizes) / np.sqrt(len(sizes))
+
+
+def main():
+    node_count = int(sys.argv[1])
+    iterations = int(sys.argv[2])
+    repetitions = int(sys.argv[3])
+    infection_prob = 0.3
+
+    g = synthetic_internet(node_count)
+
+    start = time.time()
+    ndlib_sizes = [len(graph_simulations.si(g, iterations, infection_prob, 1)[0]) for _ in range(repetitions)]
+    print(f"ndlib si: mean cascade {np.mean(ndlib_sizes)} nodes, {time.time() - start} seconds")
+
+    start = time.time()
+    native_sizes = [len(graph_simulations.native_si(g, iterations, infection_prob, 1)[0]) for _ in range(repetitions)]
+    print(f"native si: mean cascade {np.mean(native_sizes)} nodes, {time.time() - start} seconds")
+
+    start = time.time()
+    batch_sizes = [len(s) for s in graph_simulations.batch_si(g, repetitions, iterations, infection_prob, 1)[0]]
+    print(f"batch si: mean cascade {np.mean(batch_sizes)} nodes, {time.time() - start} seconds")
+
+    for name, sizes in [("native", native_sizes), ("batch", batch_sizes)]:
+        error = np.hypot(standard_error(sizes), standard_error(ndlib_sizes))
+        if abs(np.mean(sizes) - np.mean(ndlib_sizes)) <= TOLERANCE * error:
+            print(f"{name} si spreads like ndlib si")
+        else:
+            print(f"{name} si differs from ndlib si!")
+
+
+if __name__ == "__main__":
+    main()